@@ -0,0 +1,74 @@
+"""
+Reads of the Tracker with the whole history in the transactions table versus with all closed years archived,
+and the time archiving takes. The reads return the same data either way.
+
+Usage: python -m benchmarks.bench_archive [n_rows]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_database
+from helper_database import Filter, Tracker
+
+REPEAT = 5
+
+
+def timed(func, repeat=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def reads(tracker):
+    this_year = datetime.date.today().year
+    return {
+        'balance': tracker.balance,
+        'calculate_daily_balance all': lambda: tracker.calculate_daily_balance(None),
+        'expenses_by_category': tracker.expenses_by_category,
+        'expenses_by_category last year': lambda: tracker.expenses_by_category(f'{this_year - 1}-01-01'),
+        'report year': lambda: tracker.report('year'),
+        'read_transactions': tracker.read_transactions,
+        'read_expenses': tracker.read_expenses,
+        'read_transactions this year': lambda: tracker.read_transactions(
+            filter_by=Filter(start=f'{this_year}-01-01')),
+    }
+
+
+def measure(tracker):
+    cases = reads(tracker)
+    # Warm up: the first calls import pandas and cache the rollups of the closed months
+    for read in cases.values():
+        read()
+    return {name: timed(read) for name, read in cases.items()}
+
+
+def live_rows(tracker):
+    tracker.cursor.execute('SELECT COUNT(*) FROM transactions')
+    return tracker.cursor.fetchone()[0]
+
+
+def main(n_rows=1_000_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_database(os.path.join(directory, 'bench.db'), n_rows)
+        tracker = Tracker(path)
+        before = measure(tracker)
+        print(f'live rows before: {live_rows(tracker)}')
+
+        start = time.perf_counter()
+        archived = tracker.archive()
+        print(f'archive {len(archived)} years, {sum(archived.values())} rows: {time.perf_counter() - start:.2f} s')
+        print(f'live rows after:  {live_rows(tracker)}')
+        after = measure(tracker)
+
+        print(f'{"":<32} {"live":>10} {"archived":>10}')
+        for name in before:
+            print(f'{name:<32} {before[name] * 1000:7.1f} ms {after[name] * 1000:7.1f} ms')
+        tracker.close_db()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""
+Current balance from the running total versus a full scan of the transactions, the consistency check,
+and the cost the balance triggers add to bulk inserts.
+
+Usage: python -m benchmarks.bench_balance [n_rows]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker, from_cents
+
+REPEAT = 20
+
+
+def timed(func, repeat=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(n_rows=1_000_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_legacy_database(os.path.join(directory, 'bench.db'), n_rows)
+        start = time.perf_counter()
+        tracker = Tracker(path)
+        print(f'migrating {n_rows} rows: {time.perf_counter() - start:.2f} s')
+
+        def full_scan():
+            tracker.cursor.execute('SELECT SUM(amount) FROM transactions')
+            return from_cents(tracker.cursor.fetchone()[0])
+
+        elapsed, scanned = timed(full_scan)
+        print(f'full scan SUM(amount)    {elapsed * 1000:10.3f} ms  {scanned}')
+        elapsed, balance = timed(tracker.balance)
+        print(f'balance() running total  {elapsed * 1000:10.3f} ms  {balance}')
+        elapsed, _ = timed(tracker.category_balances)
+        print(f'category_balances()      {elapsed * 1000:10.3f} ms')
+        elapsed, mismatches = timed(tracker.verify_balances, repeat=1)
+        print(f'verify_balances()        {elapsed * 1000:10.3f} ms  {len(mismatches)} mismatches')
+
+        today = datetime.date.today().isoformat()
+        rows = [('Category 1', -1.25, today, 'bench')] * 10_000
+        elapsed, _ = timed(lambda: tracker.add_transactions(rows), repeat=1)
+        print(f'add_transactions 10k     {elapsed * 1000:10.3f} ms')
+        elapsed, mismatches = timed(tracker.verify_balances, repeat=1)
+        print(f'verify after insert      {elapsed * 1000:10.3f} ms  {len(mismatches)} mismatches')
+        tracker.close_db()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
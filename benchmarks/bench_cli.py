@@ -0,0 +1,57 @@
+"""
+Cold start of the command line interface: wall time of a fresh `python cli.py ...` process per
+subcommand, next to a bare interpreter, and the heavy modules each subcommand ends up importing.
+
+Usage: python -m benchmarks.bench_cli [n_rows]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker
+
+REPEAT = 10
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'tkinter', 'tkcalendar')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs cli.py like `python cli.py`, then reports the heavy modules it imported on stderr
+PROBE = f'''
+import runpy, sys
+sys.argv = ['cli.py'] + sys.argv[1:]
+runpy.run_path('cli.py', run_name='__main__')
+print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)
+'''
+
+
+def cold_start(command):
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(n_rows=100_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_legacy_database(os.path.join(directory, 'bench.db'), n_rows)
+        # Migrate once, so the runs measure the start and not the upgrade
+        Tracker(path).close_db()
+
+        elapsed = cold_start([sys.executable, '-c', 'pass'])
+        print(f'{"python -c pass":<24} {elapsed * 1000:8.1f} ms')
+        for arguments in (['balance'], ['daily', '--days', '30'], ['daily', '--all'], ['categories']):
+            command = [sys.executable, 'cli.py', '--db', path, *arguments]
+            elapsed = cold_start(command)
+            probe = subprocess.run([sys.executable, '-c', PROBE, '--db', path, *arguments], cwd=ROOT, check=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            heavy = probe.stderr.strip() or '-'
+            print(f'{" ".join(arguments):<24} {elapsed * 1000:8.1f} ms  heavy imports: {heavy}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""
+Readers and a writer on the same database at the same time, each in its own process (like the GUI,
+a cron report and a background import): with the old rollback journal versus WAL with the
+ConnectionManager. Reports read throughput and latency, written rows and "database is locked" errors.
+
+Usage: python -m benchmarks.bench_concurrency [n_rows] [readers] [seconds]
+"""
+import datetime
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_database
+from helper_connections import ConnectionManager, connect
+from helper_database import Tracker
+
+# Rows per add_transactions call of the writer, one commit each
+WRITE_BATCH = 500
+
+
+def open_tracker(path, mode, read_only):
+    if mode == 'wal':
+        return ConnectionManager(path).writer() if not read_only else Tracker(path, read_only=True)
+    # The former setup: rollback journal with full sync
+    connection = connect(path, read_only, journal_mode='DELETE', synchronous='FULL')
+    return Tracker(path, read_only, connection=connection)
+
+
+def reader(path, mode, seconds, results):
+    tracker = open_tracker(path, mode, read_only=True)
+    reads = [
+        tracker.balance,
+        lambda: tracker.calculate_daily_balance(365),
+        lambda: tracker.fetch_transactions_page(limit=200),
+        tracker.category_balances,
+    ]
+    # Warm up: the first calls import pandas
+    for read in reads:
+        read()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for read in reads:
+            start = time.perf_counter()
+            try:
+                read()
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    tracker.close_db()
+    results.put(('read', latencies, errors))
+
+
+def writer(path, mode, seconds, results):
+    tracker = open_tracker(path, mode, read_only=False)
+    today = datetime.date.today().isoformat()
+    rows = [('Food', -1.25, today, f'concurrent {i}') for i in range(WRITE_BATCH)]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            tracker.add_transactions(rows)
+        except sqlite3.OperationalError:
+            errors += 1
+            tracker.connection.rollback()
+        latencies.append(time.perf_counter() - start)
+    tracker.close_db()
+    results.put(('write', latencies, errors))
+
+
+def run(path, mode, n_readers, seconds):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=writer, args=(path, mode, seconds, results))]
+    processes += [context.Process(target=reader, args=(path, mode, seconds, results)) for _ in range(n_readers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    reads = sorted(latency for kind, latencies, _ in collected if kind == 'read' for latency in latencies)
+    writes = [latency for kind, latencies, _ in collected if kind == 'write' for latency in latencies]
+    read_errors = sum(errors for kind, _, errors in collected if kind == 'read')
+    write_errors = sum(errors for kind, _, errors in collected if kind == 'write')
+    print(f'{mode:<9} reads {len(reads) / seconds:8.0f}/s  p50 {statistics.median(reads) * 1000:7.2f} ms  '
+          f'p99 {reads[int(len(reads) * 0.99)] * 1000:8.2f} ms  max {reads[-1] * 1000:8.1f} ms  '
+          f'errors {read_errors}')
+    print(f'{"":<9} writes {len(writes) * WRITE_BATCH / seconds:7.0f} rows/s  '
+          f'max {max(writes) * 1000:8.1f} ms per {WRITE_BATCH}  errors {write_errors}')
+
+
+def main(n_rows=100_000, n_readers=3, seconds=5):
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ('rollback', 'wal'):
+            path = os.path.join(directory, f'{mode}.db')
+            build_database(path, n_rows)
+            # Sets the journal mode of the file before the processes start
+            open_tracker(path, mode, read_only=False).close_db()
+            run(path, mode, n_readers, seconds)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
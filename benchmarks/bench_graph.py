@@ -0,0 +1,43 @@
+"""
+Time to read, downsample and draw the all-time balance graph for growing histories.
+Runs off-screen with the Agg backend.
+
+Usage: python -m benchmarks.bench_graph [n_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker
+from helper_plot import BalanceGraph, prepare_graph_data
+
+REPEAT = 5
+
+
+def main(n_rows=200_000):
+    graph = BalanceGraph(None)
+    with tempfile.TemporaryDirectory() as directory:
+        for years in (1, 5, 20, 50):
+            path = build_legacy_database(os.path.join(directory, f'bench_{years}.db'), n_rows, years=years)
+            tracker = Tracker(path)
+            read = draw = 0.0
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                df = prepare_graph_data(tracker.calculate_daily_balance(n_days=None))
+                read += time.perf_counter() - start
+                start = time.perf_counter()
+                graph.update(df)
+                graph.canvas.draw()
+                draw += time.perf_counter() - start
+            print(f'{years:3} years  {len(df):5} points  read {read / REPEAT * 1000:8.2f} ms  '
+                  f'draw {draw / REPEAT * 1000:8.2f} ms')
+            tracker.close_db()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
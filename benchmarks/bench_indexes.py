@@ -0,0 +1,82 @@
+"""
+Query plans and timings of the date range and per-category queries, without and with the
+secondary indexes added by the schema migrations.
+
+Usage: python -m benchmarks.bench_indexes [n_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker
+
+REPEAT = 5
+
+
+def capture_statements(tracker, func):
+    """
+    Runs func once and returns the SELECT statements it sent to SQLite.
+    """
+    statements = []
+    tracker.connection.set_trace_callback(statements.append)
+    try:
+        func()
+    finally:
+        tracker.connection.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+
+
+def query_plan(tracker, statement):
+    rows = tracker.connection.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def run_cases(tracker, cases, label):
+    print(f'--- {label} ---')
+    for name, func in cases:
+        for statement in capture_statements(tracker, func):
+            for step in query_plan(tracker, statement):
+                print(f'    {name}: {step}')
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            func()
+        elapsed = (time.perf_counter() - start) / REPEAT
+        print(f'{name:<34} {elapsed * 1000:10.2f} ms')
+
+
+def main(n_rows=300_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_legacy_database(os.path.join(directory, 'bench.db'), n_rows)
+        tracker = Tracker(path)
+
+        def del_unused_category():
+            tracker.add_category('Unused')
+            tracker.del_category('Unused')
+
+        cases = [
+            ('fetch_transactions_last_n_days', tracker.fetch_transactions_last_n_days),
+            ('balance_before_n_days', tracker.balance_before_n_days),
+            ('read_expenses', tracker.read_expenses),
+            ('del_category', del_unused_category),
+        ]
+
+        # Drop the secondary indexes to measure the pre-migration schema, then put them back
+        tracker.cursor.execute("SELECT name, sql FROM sqlite_master "
+                               "WHERE type = 'index' AND tbl_name = 'transactions' AND sql IS NOT NULL")
+        indexes = tracker.cursor.fetchall()
+        for name, _ in indexes:
+            tracker.cursor.execute(f'DROP INDEX {name}')
+        tracker.connection.commit()
+        run_cases(tracker, cases, f'{n_rows} rows, no indexes')
+
+        for _, sql in indexes:
+            tracker.cursor.execute(sql)
+        tracker.connection.commit()
+        run_cases(tracker, cases, f'{n_rows} rows, schema version {tracker.schema_version()}')
+        tracker.close_db()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""
+Memory growth of the plots over many tab switches: a new pyplot figure per switch (how the tabs used
+to draw) versus the long-lived BalanceGraph and ExpensesPlot objects that update their artists.
+Runs off-screen with the Agg backend.
+
+Usage: python -m benchmarks.bench_plot_memory [switches]
+"""
+import gc
+import resource
+import sys
+import time
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from helper_plot import BalanceGraph, ExpensesPlot, prepare_graph_data
+
+
+def sample_data(switch):
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=30).strftime('%Y-%m-%d')
+    daily = pd.DataFrame({'date': dates, 'balance': [1000 + switch + day * 10 for day in range(30)]})
+    expenses = pd.DataFrame({'category_name': [f'Category {i}' for i in range(8)],
+                             'amount': [float(i * 10 + switch % 7) for i in range(8)]})
+    return prepare_graph_data(daily), expenses
+
+
+def new_figure_per_switch(daily, expenses):
+    fig, ax = plt.subplots(figsize=(6, 4), dpi=100)
+    ax.plot(daily['date'], daily['balance'], marker='o', color='orange')
+    fig.canvas.draw()
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.barh(y=expenses['category_name'], width=expenses['amount'], color='skyblue', edgecolor='black')
+    fig.canvas.draw()
+
+
+def rss_mib():
+    """
+    Current resident memory of the process (Linux), or the peak where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def measure(label, switches, setup):
+    gc.collect()
+    before = rss_mib()
+    start = time.perf_counter()
+    switch_tab = setup()
+    for switch in range(switches):
+        switch_tab(*sample_data(switch))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    print(f'{label:<24} {elapsed:8.2f} s  {elapsed / switches * 1000:7.1f} ms/switch  '
+          f'memory +{rss_mib() - before:8.1f} MiB  pyplot figures {len(plt.get_fignums())}')
+
+
+def main(switches=1000):
+    def persistent():
+        balance_graph, expenses_plot = BalanceGraph(None), ExpensesPlot(None)
+
+        def switch_tab(daily, expenses):
+            balance_graph.update(daily)
+            expenses_plot.update(expenses)
+        return switch_tab
+
+    measure('persistent plot objects', switches, persistent)
+    with warnings.catch_warnings():
+        # pyplot warns after 20 open figures, which is the point of this measurement
+        warnings.simplefilter('ignore', RuntimeWarning)
+        measure('new figure per switch', switches, lambda: new_figure_per_switch)
+    plt.close('all')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""
+Construction time and peak memory of read_transactions: the former fetchall() into a DataFrame of
+Python objects (with the date parsing the graph used to do) versus the typed, chunked read layer,
+as a DataFrame and as a NumPy structured array. Every variant runs in a fresh process, so the peak
+resident memory of one doesn't hide the next.
+
+Usage: python -m benchmarks.bench_read [n_rows]
+"""
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker
+
+
+def rss_mib():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def fetchall_frame(tracker):
+    import pandas as pd
+
+    tracker.cursor.execute('''
+        SELECT t.id, c.name AS category_name, t.amount, t.date, t.comment
+        FROM transactions t
+        JOIN categories c ON t.category_id = c.id
+    ''')
+    df = pd.DataFrame(tracker.cursor.fetchall(), columns=[desc[0] for desc in tracker.cursor.description])
+    df['amount'] = df['amount'] / 100
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+VARIANTS = {
+    'fetchall + DataFrame': fetchall_frame,
+    'read layer DataFrame': lambda tracker: tracker.read_transactions(),
+    'read layer NumPy array': lambda tracker: tracker.read_transactions(as_array=True),
+}
+
+
+def run(path, label, queue):
+    # Every variant pays for importing pandas before the baseline
+    importlib.import_module('pandas')
+
+    tracker = Tracker(path, read_only=True)
+    baseline = rss_mib()
+    start = time.perf_counter()
+    result = VARIANTS[label](tracker)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10 - baseline
+    size = result.memory_usage(deep=True).sum() if hasattr(result, 'memory_usage') else result.nbytes
+    queue.put((elapsed, peak, size / 2**20))
+    tracker.close_db()
+
+
+def main(n_rows=1_000_000):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_legacy_database(os.path.join(directory, 'bench.db'), n_rows)
+        # Migrate once, the variants open the database read-only
+        Tracker(path).close_db()
+        for label in VARIANTS:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(path, label, queue))
+            process.start()
+            elapsed, peak, size = queue.get()
+            process.join()
+            print(f'{label:<24} {elapsed:8.2f} s  peak +{peak:8.1f} MiB  result {size:8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,77 @@
+"""
+GUI startup: time from a fresh interpreter to the first drawn window, split into importing main,
+opening the Tracker and building the window. Needs a display; without one only the first two steps
+are measured. Also lists the heavy modules that are loaded when the window appears.
+
+Usage: python -m benchmarks.bench_startup [n_rows]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_legacy_database
+from helper_database import Tracker
+
+REPEAT = 5
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'tkcalendar')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Starts the GUI, draws the first window, prints the timings as JSON and exits without the main loop
+PROBE = f'''
+import json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import tkinter
+manager = main.ConnectionManager(sys.argv[1])
+manager.writer()
+opened = time.perf_counter()
+timings = {{'import': imported - start, 'tracker': opened - imported, 'window': None}}
+
+def first_window(root, n=0):
+    root.update()
+    timings['window'] = time.perf_counter() - opened
+    timings['heavy'] = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+    print(json.dumps(timings), flush=True)
+    os._exit(0)
+
+try:
+    tkinter.Tk().destroy()
+except tkinter.TclError:
+    timings['heavy'] = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+    print(json.dumps(timings), flush=True)
+    os._exit(0)
+tkinter.Tk.mainloop = first_window
+main.gui(manager)
+'''
+
+
+def main(n_rows=100_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = build_legacy_database(os.path.join(directory, 'bench.db'), n_rows)
+        # Migrate once, so the runs measure the start and not the upgrade
+        Tracker(path).close_db()
+
+        runs = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            probe = subprocess.run([sys.executable, '-c', PROBE, path], cwd=ROOT, check=True,
+                                   stdout=subprocess.PIPE, text=True)
+            total = time.perf_counter() - start
+            runs.append((total, json.loads(probe.stdout.splitlines()[-1])))
+        total, timings = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+
+        print(f'import main         {timings["import"] * 1000:8.1f} ms')
+        print(f'open Tracker        {timings["tracker"] * 1000:8.1f} ms')
+        if timings['window'] is None:
+            print('first window             n/a  (no display)')
+        else:
+            print(f'first window        {timings["window"] * 1000:8.1f} ms')
+        print(f'process total       {total * 1000:8.1f} ms  heavy imports: {", ".join(timings["heavy"]) or "-"}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,215 @@
+"""
+Headless benchmark suite: times the Tracker reads, the write paths and both plots on synthetic databases
+of growing size and stores the results as JSON, so runs can be compared over time.
+Plots are drawn off-screen with the Agg backend, Tk is never started.
+
+Usage: python -m benchmarks.suite [--sizes 10k,100k] [--repeat 5] [--cache DIR] [--output FILE] [--compare FILE]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+from benchmarks.synthetic import SIZES, build_database
+from helper_database import Filter, Tracker
+from helper_import import import_csv
+from helper_plot import BalanceGraph, ExpensesPlot, prepare_graph_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Rows written by the bulk write cases
+WRITE_ROWS = 10_000
+
+
+def read_cases(tracker):
+    """
+    Cases that leave the database unchanged: name -> function.
+    """
+    balance_graph = BalanceGraph(None)
+    expenses_plot = ExpensesPlot(None)
+
+    def plot_balance_graph():
+        balance_graph.update(prepare_graph_data(tracker.calculate_daily_balance(n_days=None)))
+        balance_graph.canvas.draw()
+
+    def plot_expenses():
+        expenses_plot.update(tracker.expenses_by_category())
+        expenses_plot.canvas.draw()
+
+    return {
+        'balance': tracker.balance,
+        'calculate_daily_balance 30 days': lambda: tracker.calculate_daily_balance(30),
+        'calculate_daily_balance all': lambda: tracker.calculate_daily_balance(None),
+        'expenses_by_category': tracker.expenses_by_category,
+        'read_transactions': tracker.read_transactions,
+        'read_transactions as_array': lambda: tracker.read_transactions(as_array=True),
+        'read_expenses': tracker.read_expenses,
+        'read_transactions filtered': lambda: tracker.read_transactions(
+            filter_by=Filter(start=f'{datetime.date.today().year - 1}-01-01', categories=['Food', 'Coffee'],
+                             sign='expense', max_amount=-10)),
+        'report month': tracker.report,
+        'category_report year': lambda: tracker.category_report('year'),
+        'search rare': lambda: tracker.search('florist 12'),
+        'search common prefix': lambda: tracker.search('supermar'),
+        'plot balance graph': plot_balance_graph,
+        'plot expenses': plot_expenses,
+    }
+
+
+def write_cases(tracker, directory):
+    """
+    Cases that write, run on a copy of the database: name -> function.
+    Every run deletes what it added, so the database size stays the same between repeats.
+    """
+    today = datetime.date.today().isoformat()
+    statement = os.path.join(directory, 'statement.csv')
+    with open(statement, 'w', encoding='utf-8') as file:
+        file.write('date,category,amount,comment\n')
+        file.writelines(f'{today},Food,-{i % 5000 / 100 + 1:.2f},statement {i}\n' for i in range(WRITE_ROWS))
+
+    def remove_added():
+        tracker.cursor.execute("SELECT id FROM transactions WHERE comment LIKE 'bench%' OR comment LIKE 'statement%'")
+        tracker.del_transactions([trans_id for trans_id, in tracker.cursor.fetchall()])
+
+    def add_transaction_100():
+        for i in range(100):
+            tracker.add_transaction('Food', -1.5, today, f'bench {i}')
+        remove_added()
+
+    def add_transactions_bulk():
+        tracker.add_transactions([('Food', -1.5, today, f'bench {i}') for i in range(WRITE_ROWS)])
+        remove_added()
+
+    def import_statement():
+        import_csv(tracker, statement)
+        remove_added()
+
+    return {
+        'add_transaction x100 + delete': add_transaction_100,
+        f'add_transactions {WRITE_ROWS} + delete': add_transactions_bulk,
+        f'import_csv {WRITE_ROWS} + delete': import_statement,
+    }
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(times) * 1000, 'min_ms': min(times) * 1000, 'repeat': repeat}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import numpy
+    import pandas
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def run(sizes, repeat, cache_dir, instrument=False):
+    results = []
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            n_rows = SIZES[size]
+            path = os.path.join(cache_dir or directory, f'synthetic-{size}-{datetime.date.today()}.db')
+            if not os.path.exists(path):
+                start = time.perf_counter()
+                build_database(path, n_rows)
+                print(f'{size}: built in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+            tracker = Tracker(path)
+            if instrument:
+                tracker.enable_stats()
+            for case, func in read_cases(tracker).items():
+                results.append({'size': size, 'rows': n_rows, 'case': case, **measure(func, repeat)})
+                print_result(results[-1])
+            tracker.close_db()
+
+            copy = os.path.join(directory, 'write.db')
+            shutil.copyfile(path, copy)
+            tracker = Tracker(copy)
+            if instrument:
+                tracker.enable_stats()
+            for case, func in write_cases(tracker, directory).items():
+                results.append({'size': size, 'rows': n_rows, 'case': case, **measure(func, repeat)})
+                print_result(results[-1])
+            tracker.close_db()
+            os.remove(copy)
+    return results
+
+
+def print_result(result, baseline=None):
+    line = f'{result["size"]:>5}  {result["case"]:<34} {result["median_ms"]:10.2f} ms'
+    if baseline is not None:
+        line += f'  {result["median_ms"] / baseline["median_ms"]:6.2f}x'
+    print(line)
+
+
+def compare(results, path):
+    """
+    Prints every case next to the same case of an earlier run, as the ratio new / old of the medians.
+    """
+    with open(path, encoding='utf-8') as file:
+        earlier = {(result['size'], result['case']): result for result in json.load(file)['results']}
+    print(f'\ncompared with {path} (new / old):')
+    for result in results:
+        baseline = earlier.get((result['size'], result['case']))
+        if baseline is not None:
+            print_result(result, baseline)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='10k,100k', help=f'comma separated, out of {", ".join(SIZES)}')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case, the median is reported')
+    parser.add_argument('--cache', help='directory to keep the synthetic databases in between runs')
+    parser.add_argument('--output', help='JSON file for the results, default: benchmarks/results/<time>.json')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--instrument', action='store_true', help='run with Tracker.enable_stats(), for its overhead')
+    args = parser.parse_args(argv)
+    sizes = [size.strip().lower() for size in args.sizes.split(',')]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f'unknown sizes: {", ".join(unknown)}')
+
+    meta = environment()
+    meta['instrumented'] = args.instrument
+    results = run(sizes, args.repeat, args.cache, args.instrument)
+    output = args.output or os.path.join(RESULTS_DIR, f'{meta["timestamp"].replace(":", "")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2)
+    print(f'results written to {output}', file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Builds synthetic finance databases for the benchmarks.
+
+Usage: python -m benchmarks.synthetic PATH [--rows 1m] [--categories 50] [--years 10] [--seed 0] [--end DATE]
+"""
+import argparse
+import datetime
+import itertools
+import random
+import sqlite3
+import sys
+import time
+
+# Named sizes of the benchmark databases
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+# Words of the expense comments, so searches match realistic shares of the rows
+MERCHANTS = ['supermarket', 'bakery', 'pharmacy', 'cafe', 'restaurant', 'bookshop', 'cinema', 'petrol station',
+             'hardware store', 'online shop', 'train ticket', 'gym', 'florist', 'kiosk', 'market stall',
+             'electronics', 'clothing store', 'pizzeria', 'taxi', 'hotel', 'parking', 'butcher', 'bike repair']
+
+LEGACY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    date DATE NOT NULL,
+    comment TEXT,
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+);
+'''
+
+
+def build_legacy_database(path, n_rows, n_categories=20, years=5, seed=0):
+    """
+    Writes a database with the original (unversioned, index-free) schema and n_rows random transactions
+    spread over the last `years` years. Category 1 is 'Income', like in the app.
+    :param path: file to create, must not exist yet
+    :param n_rows: number of transactions
+    :param n_categories: number of categories including 'Income'
+    :param years: span of the transaction dates, ending today
+    :param seed: seed for the random generator, so runs are reproducible
+    :return: str, the path
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    span = years * 365
+    connection = sqlite3.connect(path)
+    connection.executescript(LEGACY_SCHEMA)
+    names = ['Income'] + [f'Category {i}' for i in range(1, n_categories)]
+    connection.executemany('INSERT INTO categories (name) VALUES (?)', [(name,) for name in names])
+
+    def rows():
+        for i in range(n_rows):
+            category_id = rng.randint(1, n_categories)
+            amount = round(rng.uniform(500, 3000), 2) if category_id == 1 else -round(rng.uniform(1, 200), 2)
+            date = today - datetime.timedelta(days=rng.randrange(span))
+            yield category_id, amount, date.isoformat(), f'synthetic {i}'
+
+    connection.executemany('INSERT INTO transactions (category_id, amount, date, comment) VALUES (?, ?, ?, ?)',
+                           rows())
+    connection.commit()
+    connection.close()
+    return path
+
+
+def _daily_rows(n_rows, n_categories, start, days, rng):
+    """
+    Generates (category_id, cents, date, comment) in date order: a salary on the first of every month,
+    the remaining rows spread evenly over the days, with a few categories much more frequent than the
+    rest (weights 1/rank) and amounts between a few cents and a few hundred euros.
+    The salary covers about one month of spending, so the balance stays in a realistic range.
+    """
+    # Mean of the log-normal expenses is exp(7 + 1.2**2 / 2), about 22.5 euros
+    salary = int(n_rows / days * 30.4 * 2300)
+    categories = range(2, n_categories + 1)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, n_categories)))
+    emitted = 0
+    for day in range(days):
+        date = start + datetime.timedelta(days=day)
+        iso = date.isoformat()
+        count = (day + 1) * n_rows // days - day * n_rows // days
+        if date.day == 1 and count:
+            yield 1, int(salary * rng.uniform(0.9, 1.1)), iso, f'salary {emitted}'
+            emitted += 1
+            count -= 1
+        for category_id in rng.choices(categories, cum_weights=cum_weights, k=count):
+            yield (category_id, -int(rng.lognormvariate(7, 1.2)) - 1, iso,
+                   f'{MERCHANTS[emitted % len(MERCHANTS)]} {emitted}')
+            emitted += 1
+
+
+def build_database(path, n_rows, n_categories=50, years=10, seed=0, end=None, chunk_size=100_000):
+    """
+    Writes a database with the current schema and n_rows transactions over `years` years up to `end`.
+    The rows are written in date order without triggers and indexes, which are recreated afterwards
+    and the aggregates rebuilt, so even 10M rows take minutes instead of hours.
+    The same arguments always give the same transactions.
+    :param path: file to create, must not exist yet
+    :param n_rows: number of transactions, besides the seed transactions of the Tracker
+    :param n_categories: number of categories including 'Income'
+    :param years: span of the transaction dates
+    :param seed: seed for the random generator
+    :param end: ISO date of the last day, None for today
+    :param chunk_size: rows per executemany
+    :return: str, the path
+    """
+    from helper_database import Tracker
+
+    end = datetime.date.fromisoformat(end) if end else datetime.date.today()
+    days = years * 365
+    start = end - datetime.timedelta(days=days - 1)
+    rng = random.Random(seed)
+
+    # The Tracker creates the schema and the seed categories (Income, Rent, Food, Coffee)
+    tracker = Tracker(path)
+    cursor = tracker.cursor
+    with tracker.batch():
+        for i in range(len(tracker.category_names()) + 2, n_categories + 1):
+            tracker.add_category(f'Category {i}')
+
+    cursor.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'transactions' AND type IN ('trigger', 'index') AND sql IS NOT NULL
+    """)
+    derived = cursor.fetchall()
+    with tracker.batch():
+        for kind, name, _ in derived:
+            cursor.execute(f'DROP {kind.upper()} {name}')
+        rows = _daily_rows(n_rows, n_categories, start, days, rng)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            cursor.executemany('INSERT INTO transactions (category_id, amount, date, comment) VALUES (?, ?, ?, ?)',
+                               chunk)
+        for _, _, sql in derived:
+            cursor.execute(sql)
+    tracker.rebuild_daily_totals()
+    tracker.rebuild_balances()
+    tracker.rebuild_search_index()
+    # The bulk load ran without the triggers that invalidate cached rollups
+    tracker.clear_rollups()
+    tracker.close_db()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.synthetic', description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help='database file to create')
+    parser.add_argument('--rows', default='100k', help=f'number of transactions or one of {", ".join(SIZES)}')
+    parser.add_argument('--categories', type=int, default=50, help='number of categories (default: 50)')
+    parser.add_argument('--years', type=int, default=10, help='span of the dates in years (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--end', help='last day (YYYY-MM-DD), default: today')
+    args = parser.parse_args(argv)
+    n_rows = SIZES[args.rows.lower()] if args.rows.lower() in SIZES else int(args.rows)
+
+    start = time.perf_counter()
+    build_database(args.path, n_rows, args.categories, args.years, args.seed, args.end)
+    print(f'{args.path}: {n_rows} transactions in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Command line reports and imports without the GUI, for servers without a display.
+
+Usage:
+    python cli.py [--db PATH] [--format json|csv] balance
+    python cli.py [--db PATH] [--format json|csv] daily [--days N | --start DATE [--end DATE]]
+    python cli.py [--db PATH] [--format json|csv] categories [--start DATE] [--end DATE]
+    python cli.py [--db PATH] [--format json|csv] report [--period month|year] [--start P] [--end P] [--categories]
+    python cli.py [--db PATH] [--format json|csv] search WORDS... [--limit N] [--offset N]
+    python cli.py [--db PATH] [--format json|csv] import STATEMENT.csv [--delimiter ;] [--decimal ,]
+    python cli.py [--db PATH] [--format json|csv] archive [--until YEAR]
+    python cli.py [--db PATH] [--format json|csv] restore YEAR
+    python cli.py [--db PATH] [--format json|csv] verify [--rebuild]
+
+Only the standard library and helper_database are imported at start; every subcommand imports
+what it needs when it runs (NumPy for the category totals, reports and the archive), never tkinter, tkcalendar
+or matplotlib.
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+
+from helper_database import Tracker
+
+
+def write(rows, columns, output_format, out=sys.stdout):
+    """
+    Prints rows as a JSON list of objects or as CSV with a header line.
+    Decimal amounts are written as numbers.
+    :param rows: iterable of tuples in the order of columns
+    :param columns: list of column names
+    """
+    if output_format == 'csv':
+        import csv
+
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows)
+    else:
+        import decimal
+        import json
+
+        def number(value):
+            if isinstance(value, decimal.Decimal):
+                return float(value)
+            raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+        json.dump([dict(zip(columns, row)) for row in rows], out, default=number, indent=2)
+        out.write('\n')
+
+
+def iso_date(value):
+    """
+    argparse type of a day, so a wrong date is a usage error instead of a wrong result.
+    :param value: 'YYYY-MM-DD'
+    :return: str, the date in ISO format
+    """
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid date {value!r}, expected YYYY-MM-DD')
+
+
+def report_period(value):
+    """
+    argparse type of a report period, parse_args() checks that it matches --period.
+    :param value: 'YYYY-MM' or 'YYYY'
+    :return: str
+    """
+    if not re.fullmatch(r'\d{4}(-(0[1-9]|1[0-2]))?', value):
+        raise argparse.ArgumentTypeError(f'invalid period {value!r}, expected YYYY-MM or YYYY')
+    return value
+
+
+def balance(tracker, args):
+    return [(tracker.balance(),)], ['balance']
+
+
+def daily(tracker, args):
+    start = args.start
+    if start is None and args.days is not None:
+        start = (datetime.date.today() - datetime.timedelta(days=args.days)).isoformat()
+    # Decimal running sum over the daily totals, no pandas needed
+    running = tracker.balance_before(start) if start is not None else 0
+    rows = []
+    for date, amount in tracker.fetch_daily_totals(start, args.end):
+        running += amount
+        rows.append((date, running))
+    return rows, ['date', 'balance']
+
+
+def categories(tracker, args):
+    totals = tracker.expenses_by_category(args.start, args.end, as_array=True)
+    return [(name, round(float(amount), 2)) for name, amount in totals.tolist()], ['category', 'amount']
+
+
+def report(tracker, args):
+    if args.categories:
+        rows = tracker.category_report(args.period, args.start, args.end, as_array=True)
+        columns = ['period', 'category', 'income', 'expenses', 'net', 'share']
+    else:
+        rows = tracker.report(args.period, args.start, args.end, as_array=True)
+        columns = ['period', 'income', 'expenses', 'net', 'balance']
+    return [tuple(round(value, 2) if isinstance(value, float) else value for value in row)
+            for row in rows.tolist()], columns
+
+
+def search(tracker, args):
+    rows = tracker.search(' '.join(args.words), limit=args.limit, offset=args.offset)
+    return rows, ['id', 'date', 'category', 'amount', 'comment']
+
+
+def import_statement(tracker, args):
+    from helper_import import import_csv
+
+    result = import_csv(tracker, args.statement, delimiter=args.delimiter, decimal=args.decimal)
+    for line, message in result['errors']:
+        print(f'{args.statement}:{line}: {message}', file=sys.stderr)
+    row = (result['rows'], result['inserted'], result['duplicates'], len(result['errors']),
+           round(result['seconds'], 3))
+    return [row], ['rows', 'inserted', 'duplicates', 'errors', 'seconds']
+
+
+def archive(tracker, args):
+    archived = tracker.archive(args.until)
+    return sorted(archived.items()), ['year', 'archived']
+
+
+def restore(tracker, args):
+    return [(args.year, tracker.restore_year(args.year))], ['year', 'restored']
+
+
+def verify(tracker, args):
+    """
+    Compares the daily totals and the running balances with the transactions, and recomputes the wrong ones
+    with --rebuild. Lists every wrong day and balance, the check passed if there are none.
+    """
+    rows = [('daily_totals', date, stored, actual)
+            for date, stored, _, actual, _ in tracker.verify_daily_totals()]
+    if rows and args.rebuild:
+        tracker.rebuild_daily_totals()
+    # The key of a balance is a category id or 'total'
+    balances = [('balances', key, stored, actual) for key, stored, actual in tracker.verify_balances()]
+    if balances and args.rebuild:
+        tracker.rebuild_balances()
+    return rows + balances, ['aggregate', 'key', 'stored', 'actual']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='cli.py', description='Finance Tracker reports without the GUI.')
+    parser.add_argument('--db', default='example.db', help='SQLite database file (default: example.db)')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help='output format (default: json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('balance', help='current balance')
+    command.set_defaults(run=balance)
+
+    command = commands.add_parser('daily', help='balance at the end of every day with transactions')
+    command.add_argument('--days', type=int, default=30, help='last N days (default: 30)')
+    command.add_argument('--start', type=iso_date, help='first day (YYYY-MM-DD), replaces --days')
+    command.add_argument('--end', type=iso_date, help='last day (YYYY-MM-DD), default: no limit')
+    command.add_argument('--all', dest='days', action='store_const', const=None, help='the whole history')
+    command.set_defaults(run=daily)
+
+    command = commands.add_parser('categories', help='total spending per category')
+    command.add_argument('--start', type=iso_date, help='first day (YYYY-MM-DD), default: the beginning')
+    command.add_argument('--end', type=iso_date, help='last day (YYYY-MM-DD), default: no limit')
+    command.set_defaults(run=categories)
+
+    command = commands.add_parser('report', help='income, expenses, net and balance per month or year')
+    command.add_argument('--period', choices=('month', 'year'), default='month', help='(default: month)')
+    command.add_argument('--start', type=report_period, help='first period (YYYY-MM or YYYY), default: the beginning')
+    command.add_argument('--end', type=report_period, help='last period (YYYY-MM or YYYY), default: the latest')
+    command.add_argument('--categories', action='store_true', help='one row per period and category')
+    command.set_defaults(run=report)
+
+    command = commands.add_parser('search', help='transactions by words in their comment or category')
+    command.add_argument('words', nargs='+', help='words to find, the last one also matches as a prefix')
+    command.add_argument('--limit', type=int, default=50, help='number of results (default: 50)')
+    command.add_argument('--offset', type=int, default=0, help='number of results to skip (default: 0)')
+    command.set_defaults(run=search)
+
+    command = commands.add_parser('import', help='import a CSV bank statement')
+    command.add_argument('statement', help='CSV file with the columns date, category, amount and comment')
+    command.add_argument('--delimiter', default=',', help='CSV field separator (default: ,)')
+    command.add_argument('--decimal', default='.', choices=('.', ','), help='decimal separator (default: .)')
+    command.set_defaults(run=import_statement)
+
+    command = commands.add_parser('archive', help='move the transactions of closed years into the archive')
+    command.add_argument('--until', type=int, help='last year to archive (default: the previous year)')
+    command.set_defaults(run=archive)
+
+    command = commands.add_parser('restore', help='move an archived year back into the transactions table')
+    command.add_argument('year', type=int, help='year to restore')
+    command.set_defaults(run=restore)
+
+    command = commands.add_parser('verify', help='check the daily totals and balances against the transactions')
+    command.add_argument('--rebuild', action='store_true', help='recompute the aggregates that are wrong')
+    command.set_defaults(run=verify)
+
+    args = parser.parse_args(argv)
+    if args.command == 'report':
+        expected = 'YYYY-MM' if args.period == 'month' else 'YYYY'
+        for value in (args.start, args.end):
+            if value is not None and len(value) != len(expected):
+                parser.error(f'invalid {args.period} {value!r}, expected {expected}')
+    # Opening a wrong path would create an empty database, only an import may start a new one
+    if args.command != 'import' and not os.path.isfile(args.db):
+        parser.error(f'database {args.db!r} does not exist')
+    return args
+
+
+def main(argv=None):
+    """
+    :return: int, exit status: 1 if verify found wrong aggregates and didn't rebuild them, otherwise 0
+    """
+    args = parse_args(argv)
+    tracker = Tracker(args.db)
+    try:
+        rows, columns = args.run(tracker, args)
+    finally:
+        tracker.close_db()
+    write(rows, columns, args.format)
+    return 1 if args.command == 'verify' and rows and not args.rebuild else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
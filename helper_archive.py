@@ -0,0 +1,418 @@
+import mmap
+import os
+import re
+import shutil
+import unicodedata
+
+import numpy as np
+
+import helper_read
+
+# Numeric columns of an archived year, one memory-mapped .npy file each. Rows are sorted by date and id.
+ARRAY_COLUMNS = {'id': np.int64, 'date': 'datetime64[D]', 'amount': np.int64, 'category_id': np.int64}
+# Text columns, stored as one UTF-8 file <name>.txt and the byte offset of every row in <name>_offsets.npy;
+# the files are memory-mapped too and only the rows that are read get decoded. NULL is stored as ''
+TEXT_COLUMNS = ('comment', 'fingerprint')
+# Derived text column: the words of every comment as the full-text index sees them, separated by spaces and
+# ended by a newline, so a word is found in all rows of a year with one regular expression
+WORDS_COLUMN = 'words'
+
+
+def archive_directory(db_path):
+    """
+    Directory that holds the archived years of a database, next to the database file.
+    """
+    return os.path.abspath(db_path) + '.archive'
+
+
+def _write_text(directory, name, values):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f'{name}.txt'), 'wb') as file:
+        file.write(b''.join(encoded))
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets)
+
+
+def write_year(directory, name, columns):
+    """
+    Writes the rows of one year into a new subdirectory. The files appear under their final name only
+    once they are complete, a crash leaves at most a '.tmp' directory behind.
+    :param directory: archive directory
+    :param name: name of the subdirectory, must not be in use by a committed year
+    :param columns: dict, column name -> NumPy array (ARRAY_COLUMNS) or list of str (TEXT_COLUMNS)
+    :return: str, path of the subdirectory
+    """
+    path = os.path.join(directory, name)
+    temporary = path + '.tmp'
+    for stale in (temporary, path):
+        shutil.rmtree(stale, ignore_errors=True)
+    os.makedirs(temporary)
+    for column, dtype in ARRAY_COLUMNS.items():
+        np.save(os.path.join(temporary, f'{column}.npy'), np.asarray(columns[column], dtype=dtype))
+    for column in TEXT_COLUMNS:
+        _write_text(temporary, column, [value or '' for value in columns[column]])
+    _write_text(temporary, WORDS_COLUMN, [' '.join(_words(comment or '')) + '\n' for comment in columns['comment']])
+    os.replace(temporary, path)
+    return path
+
+
+def _words(text):
+    """
+    Lower-case words without diacritics, like the unicode61 tokenizer of the full-text index.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return re.findall(r'[^\W_]+', ''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def _search_terms(text):
+    """
+    Words of a search text as (word, is prefix) pairs: all words must occur, the last one as a prefix.
+    """
+    words = _words(text)
+    return [(word, position == len(words) - 1) for position, word in enumerate(words)]
+
+
+class ArchivedYear:
+    """
+    The files of one archived year. All columns are memory-mapped, so only the pages a read touches
+    are loaded, and the files stay readable while this object is open even if they are deleted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._arrays = {}
+        # Text column -> (memory-mapped bytes, byte offsets of the rows)
+        self._texts = {}
+
+    def column(self, name):
+        """
+        :return: read-only memory-mapped array of a column in ARRAY_COLUMNS
+        """
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def __len__(self):
+        return len(self.column('id'))
+
+    def _text(self, name):
+        if name not in self._texts:
+            offsets = np.load(os.path.join(self.path, f'{name}_offsets.npy'))
+            data = b''
+            # An empty file can't be mapped
+            if offsets[-1]:
+                with open(os.path.join(self.path, f'{name}.txt'), 'rb') as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._texts[name] = data, offsets
+        return self._texts[name]
+
+    def text(self, name, rows):
+        """
+        :param name: column in TEXT_COLUMNS
+        :param rows: array of row positions
+        :return: list of str
+        """
+        if not len(rows):
+            return []
+        data, offsets = self._text(name)
+        rows = np.asarray(rows)
+        return [data[start:end].decode('utf-8')
+                for start, end in zip(offsets[rows].tolist(), offsets[rows + 1].tolist())]
+
+    def columns(self):
+        """
+        All rows of the year, for restoring it.
+        :return: dict, column name -> array (ARRAY_COLUMNS) or list of str (TEXT_COLUMNS)
+        """
+        rows = np.arange(len(self))
+        columns = {name: np.array(self.column(name)) for name in ARRAY_COLUMNS}
+        columns.update((name, self.text(name, rows)) for name in TEXT_COLUMNS)
+        return columns
+
+    def word_rows(self, word, prefix=False):
+        """
+        Rows whose comment contains a word, found in the words file without decoding the comments.
+        :param word: word as returned by _words()
+        :param prefix: also match words that start with it
+        :return: array of row positions, ascending
+        """
+        data, offsets = self._text(WORDS_COLUMN)
+        pattern = rb'(?<![^ \n])' + re.escape(word.encode('utf-8')) + (b'' if prefix else rb'(?![^ \n])')
+        starts = np.fromiter((match.start() for match in re.finditer(pattern, data)), dtype=np.int64)
+        return np.unique(np.searchsorted(offsets, starts, side='right') - 1)
+
+    def _text_matches(self, rows, text, category_words=None):
+        """
+        Rows of rows that contain all words of a text, the last one as a prefix, like the full-text index.
+        :param category_words: function (word, prefix) -> ids of the categories whose name matches the word,
+            to also match category names like Tracker.search(); None to match the comment only
+        """
+        terms = _search_terms(text)
+        if not terms:
+            # Like the full-text index, a text without words ("-", "!!!") matches nothing
+            return rows[:0]
+        for word, prefix in terms:
+            matched = np.isin(rows, self.word_rows(word, prefix), assume_unique=True)
+            if category_words is not None:
+                matched |= np.isin(self.column('category_id')[rows], category_words(word, prefix))
+            rows = rows[matched]
+        return rows
+
+    def select(self, filter_by=None, category_ids=None, exclude_category_id=None, search=None, category_words=None):
+        """
+        Positions of the rows that match a Filter, found with NumPy on the memory-mapped columns.
+        :param filter_by: helper_database.Filter or None for all rows
+        :param category_ids: dict, category name -> id, needed for a filter on categories
+        :param exclude_category_id: category id whose rows never match, e.g. Income for the expenses
+        :param search: search text that must occur in the comment or the category name, see _text_matches()
+        :param category_words: see _text_matches(), needed for search
+        :return: array of row positions, ascending
+        """
+        dates = self.column('date')
+        first, last = 0, len(dates)
+        # The dates are sorted, a date range is a slice
+        if filter_by is not None and filter_by.start is not None:
+            first = int(np.searchsorted(dates, np.datetime64(filter_by.start, 'D'), side='left'))
+        if filter_by is not None and filter_by.end is not None:
+            last = int(np.searchsorted(dates, np.datetime64(filter_by.end, 'D'), side='right'))
+        if first >= last:
+            return np.empty(0, dtype=np.int64)
+        mask = np.ones(last - first, dtype=bool)
+        amounts = self.column('amount')[first:last]
+        if exclude_category_id is not None:
+            mask &= self.column('category_id')[first:last] != exclude_category_id
+        if filter_by is not None:
+            from helper_database import to_cents
+
+            if filter_by.categories is not None:
+                wanted = [category_ids[name] for name in filter_by.categories if name in category_ids]
+                mask &= np.isin(self.column('category_id')[first:last], wanted)
+            if filter_by.min_amount is not None:
+                mask &= amounts >= to_cents(filter_by.min_amount)
+            if filter_by.max_amount is not None:
+                mask &= amounts <= to_cents(filter_by.max_amount)
+            if filter_by.sign is not None:
+                mask &= amounts > 0 if filter_by.sign == 'income' else amounts < 0
+        rows = np.flatnonzero(mask) + first
+        if filter_by is not None and filter_by.text is not None:
+            rows = self._text_matches(rows, filter_by.text)
+        if search is not None:
+            rows = self._text_matches(rows, search, category_words)
+        return rows
+
+
+class Archive:
+    """
+    The archived years of one database. The database lists the committed years (archived_years),
+    this class opens their files. A year that is archived again gets a new directory, and the old one is
+    only deleted by the next run of Tracker.archive() or Tracker.restore_year(), so a reader that looked up
+    the year before the commit still finds its files. Files a reader has mapped stay readable even after that.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Directory name -> ArchivedYear
+        self._years = {}
+        # Arguments and result of the last _matching() call, the pages of one table or search share it
+        self._matching_key = None
+        self._matching_rows = None
+
+    def year(self, name):
+        """
+        :param name: directory name of a committed year, e.g. '2019-1'
+        :return: ArchivedYear
+        """
+        if name not in self._years:
+            self._years[name] = ArchivedYear(os.path.join(self.directory, name))
+        return self._years[name]
+
+    def forget(self, keep):
+        """
+        Drops the open files of all years except those in keep.
+        """
+        for name in list(self._years):
+            if name not in keep:
+                del self._years[name]
+        if self._matching_key is not None and self._matching_key[0] != tuple(keep):
+            self._matching_key = self._matching_rows = None
+
+    def select(self, names, filter_by=None, category_ids=None, exclude_category_id=None, text=(), search=None,
+               category_names=None):
+        """
+        Matching rows of several years, oldest first, so in (date, id) order.
+        :param names: directory names of the years to read, oldest first
+        :param text: text columns to decode, e.g. ('comment',)
+        :param search: search text that must occur in the comment or the category name
+        :param category_names: dict, category id -> name, needed for search
+        :return: dict, column name -> array of the matching rows (list of str for text columns);
+            'year' (position in names) and 'row' locate every row in its year's files
+        """
+        category_tokens = {category_id: _words(name) for category_id, name in (category_names or {}).items()}
+
+        def category_words(word, prefix):
+            return [category_id for category_id, tokens in category_tokens.items()
+                    if any(token == word or prefix and token.startswith(word) for token in tokens)]
+
+        parts = []
+        for index, name in enumerate(names):
+            year = self.year(name)
+            rows = year.select(filter_by, category_ids, exclude_category_id, search, category_words)
+            part = {column: year.column(column)[rows] for column in ARRAY_COLUMNS}
+            part['year'] = np.full(len(rows), index, dtype=np.int64)
+            part['row'] = rows
+            part.update((column, year.text(column, rows)) for column in text)
+            parts.append(part)
+        columns = {column: np.concatenate([part[column] for part in parts]) if parts
+                   else np.empty(0, dtype=dtype)
+                   for column, dtype in {**ARRAY_COLUMNS, 'year': np.int64, 'row': np.int64}.items()}
+        columns.update((column, [value for part in parts for value in part[column]]) for column in text)
+        return columns
+
+    def _matching(self, names, filter_by, category_ids, search, category_names):
+        """
+        select() without text columns, cached for the next call with the same arguments, so paging through
+        the rows doesn't select them again for every page.
+        """
+        key = (tuple(names), filter_by, search, category_ids if filter_by is not None else None,
+               category_names if search is not None else None)
+        if self._matching_key != key:
+            self._matching_rows = self.select(names, filter_by, category_ids, search=search,
+                                              category_names=category_names)
+            self._matching_key = key
+        return self._matching_rows
+
+    def _rows(self, names, selected, positions, category_names):
+        """
+        :return: list of (id, ISO date, category name, amount in cents, comment) of selected rows
+        """
+        comments = {}
+        for index in np.unique(selected['year'][positions]).tolist():
+            in_year = positions[selected['year'][positions] == index]
+            comments.update(zip(in_year.tolist(), self.year(names[index]).text('comment', selected['row'][in_year])))
+        dates = np.datetime_as_string(selected['date'][positions], unit='D').tolist()
+        return [(trans_id, date, category_names.get(category_id), amount, comments[position])
+                for trans_id, date, category_id, amount, position
+                in zip(selected['id'][positions].tolist(), dates, selected['category_id'][positions].tolist(),
+                       selected['amount'][positions].tolist(), positions.tolist())]
+
+    def page(self, names, order_by, after, limit, descending, filter_by=None, category_names=None):
+        """
+        One page of archived transactions in an order of Tracker.fetch_transactions_page(), to be merged
+        with the page of the transactions table.
+        :param names: directory names of the years, oldest first
+        :param order_by: 'date' (date, id), 'amount' (amount, id) or 'category' (category name, date, id);
+            in date order a page is found by binary search, the others compare all matching rows
+        :param after: key of the last row of the previous page as a tuple in the order above, with the date
+            as ISO string, the amount in cents and the category name; None for the first page
+        :param limit: number of rows
+        :param descending: sort direction
+        :param filter_by: helper_database.Filter or None
+        :param category_names: dict, category id -> name
+        :return: list of (id, ISO date, category name, amount in cents, comment)
+        """
+        category_ids = {name: category_id for category_id, name in category_names.items()}
+        selected = self._matching(names, filter_by, category_ids, None, None)
+        if order_by == 'category':
+            # Rank of every category id in the order of the names; rank of the key's name between them
+            # if it is gone, so the key still falls between the right rows
+            ordered = sorted(category_names.items(), key=lambda item: item[1])
+            sorted_names = [name for _, name in ordered]
+            size = max(max(category_names, default=0), int(selected['category_id'].max(initial=0))) + 1
+            ranks = np.full(size, float(len(ordered)))
+            ranks[[category_id for category_id, _ in ordered]] = np.arange(len(ordered))
+            keys = [ranks[selected['category_id']], selected['date'], selected['id']]
+            if after is not None:
+                rank = float(np.searchsorted(np.array(sorted_names, dtype=object), after[0]))
+                if rank >= len(sorted_names) or sorted_names[int(rank)] != after[0]:
+                    rank -= 0.5
+                after = (rank, np.datetime64(after[1], 'D'), after[2])
+        elif order_by == 'amount':
+            keys = [selected['amount'], selected['id']]
+        else:
+            # The rows are in (date, id) order already, the page is a slice next to the key
+            dates, ids = selected['date'], selected['id']
+            cut = len(ids) if descending else 0
+            if after is not None:
+                day = np.datetime64(after[0], 'D')
+                first = int(np.searchsorted(dates, day, side='left'))
+                last = int(np.searchsorted(dates, day, side='right'))
+                cut = first + int(np.searchsorted(ids[first:last], after[1], side='left' if descending else 'right'))
+            if descending:
+                positions = np.arange(max(cut - limit, 0), cut)[::-1]
+            else:
+                positions = np.arange(cut, min(cut + limit, len(ids)))
+            return self._rows(names, selected, positions, category_names)
+
+        candidates = np.arange(len(selected['id']))
+        if after is not None:
+            # Rows after the key in lexicographic order
+            beyond = np.zeros(len(candidates), dtype=bool)
+            equal = np.ones(len(candidates), dtype=bool)
+            for key, value in zip(keys, after):
+                beyond |= equal & ((key < value) if descending else (key > value))
+                equal &= key == value
+            candidates = np.flatnonzero(beyond)
+        if len(candidates) > limit:
+            # Only rows whose first key is among the first `limit` can be on the page, the rest isn't sorted
+            primary = keys[0][candidates]
+            if descending:
+                threshold = np.partition(primary, len(primary) - limit)[len(primary) - limit]
+                candidates = candidates[primary >= threshold]
+            else:
+                threshold = np.partition(primary, limit - 1)[limit - 1]
+                candidates = candidates[primary <= threshold]
+        order = np.lexsort([key[candidates] for key in reversed(keys)])
+        if descending:
+            order = order[::-1]
+        return self._rows(names, selected, candidates[order[:limit]], category_names)
+
+    def search(self, names, text, limit, offset=0, filter_by=None, category_names=None):
+        """
+        Archived transactions with all words of a text in their comment or category name, the last word as
+        a prefix, highest id (latest added) first like the live matches of Tracker.search().
+        :param names: directory names of the years, oldest first
+        :param limit: number of rows
+        :param offset: number of matches to skip
+        :param filter_by: helper_database.Filter or None
+        :param category_names: dict, category id -> name
+        :return: list of (id, ISO date, category name, amount in cents, comment)
+        """
+        category_ids = {name: category_id for category_id, name in category_names.items()}
+        selected = self._matching(names, filter_by, category_ids, text, category_names)
+        # The rows are in (date, id) order, not in id order
+        positions = np.argsort(selected['id'], kind='stable')[::-1][offset:offset + limit]
+        return self._rows(names, selected, positions, category_names)
+
+    def contains(self, names, ids):
+        """
+        :param ids: iterable of transaction ids
+        :return: set of the ids that are archived
+        """
+        ids = np.fromiter((int(trans_id) for trans_id in ids), dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        for name in names:
+            found |= np.isin(ids, self.year(name).column('id'))
+        return set(ids[found].tolist())
+
+    def to_columns(self, rows, kinds, category_names):
+        """
+        Converts selected rows into the typed columns of helper_read.fetch_columns(), so they can be
+        concatenated with the columns of a query.
+        :param rows: result of select()
+        :param kinds: list of (column name, kind), the names of TRANSACTION_COLUMNS
+        :param category_names: dict, category id -> name
+        :return: dict, column name -> NumPy array
+        """
+        category_ids = np.array(sorted(category_names), dtype=np.int64)
+        columns = {}
+        for name, kind in kinds:
+            if kind == 'category':
+                columns[name] = helper_read.category_codes(rows['category_id'], category_ids)
+            elif kind == 'cents':
+                columns[name] = rows[name] / 100
+            elif kind == 'text':
+                columns[name] = np.array(rows[name], dtype=object)
+            else:
+                columns[name] = rows[name]
+        return columns
@@ -0,0 +1,104 @@
+import contextlib
+import pathlib
+import queue
+import sqlite3
+import threading
+
+# How long a connection waits for a lock held by another connection before failing with "database is locked"
+BUSY_TIMEOUT_MS = 5000
+# Journal mode of the database file. In WAL mode readers don't block the writer and the writer doesn't block readers
+JOURNAL_MODE = 'WAL'
+# NORMAL is safe with WAL (a power loss can only lose the last commits, never corrupt the file) and
+# saves an fsync per commit compared to FULL
+SYNCHRONOUS = 'NORMAL'
+
+
+def connect(db_path, read_only=False, journal_mode=JOURNAL_MODE, synchronous=SYNCHRONOUS,
+            busy_timeout_ms=BUSY_TIMEOUT_MS):
+    """
+    Opens a connection with the pragmas of the app. The connection is not bound to the opening thread,
+    but only one thread may use it at a time.
+    :param db_path: path of the SQLite database file
+    :param read_only: open with mode=ro, the journal mode is left as the writer set it
+    :param journal_mode: journal mode the writer sets for the file, e.g. 'WAL' or 'DELETE'
+    :param synchronous: synchronous pragma of a writing connection, e.g. 'NORMAL' or 'FULL'
+    :param busy_timeout_ms: how long to wait for locks
+    :return: sqlite3.Connection
+    """
+    if read_only:
+        uri = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=busy_timeout_ms / 1000)
+    else:
+        connection = sqlite3.connect(db_path, check_same_thread=False, timeout=busy_timeout_ms / 1000)
+        connection.execute(f'PRAGMA journal_mode = {journal_mode}')
+        connection.execute(f'PRAGMA synchronous = {synchronous}')
+    connection.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+    return connection
+
+
+class ConnectionManager:
+    """
+    Owns the connections to one database: a single writing Tracker, and a pool of read-only Trackers
+    that threads borrow for a read. With WAL the readers see the last commit and never wait for the writer.
+    The writer belongs to the thread that opened it (the Tk thread in the GUI), other threads only read.
+    """
+
+    def __init__(self, db_path='example.db', readers=4):
+        """
+        :param db_path: path of the SQLite database file
+        :param readers: maximum number of read-only Trackers, a borrower waits when all are in use
+        """
+        self.db_path = db_path
+        self.size = readers
+        self._writer = None
+        self._idle = queue.LifoQueue()
+        self._readers = []
+        self._lock = threading.Lock()
+
+    def writer(self):
+        """
+        The writing Tracker, opened (and the schema created and migrated) on first use.
+        Open it before the first reader, a read-only connection can't create the database.
+        :return: Tracker
+        """
+        from helper_database import Tracker
+
+        with self._lock:
+            if self._writer is None:
+                self._writer = Tracker(self.db_path)
+            return self._writer
+
+    @contextlib.contextmanager
+    def reader(self):
+        """
+        Borrows a read-only Tracker for the duration of the with block. Safe to call from any thread.
+        """
+        from helper_database import Tracker
+
+        try:
+            tracker = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = len(self._readers) < self.size
+                if create:
+                    tracker = Tracker(self.db_path, read_only=True)
+                    self._readers.append(tracker)
+            if not create:
+                tracker = self._idle.get()
+        try:
+            yield tracker
+        finally:
+            self._idle.put(tracker)
+
+    def close(self):
+        """
+        Closes the writer and all readers, none of them may be in use anymore.
+        """
+        with self._lock:
+            for tracker in self._readers:
+                tracker.close_db()
+            self._readers = []
+            self._idle = queue.LifoQueue()
+            if self._writer is not None:
+                self._writer.close_db()
+                self._writer = None
@@ -1,13 +1,548 @@
+import contextlib
+import decimal
+import json
+import operator
+import os
+import re
 import sqlite3
-import pandas as pd
-from tkinter import messagebox
 import datetime
 
+import helper_connections
+
+# tkinter (for the error dialogs) and helper_read (NumPy, pandas) are imported on first use,
+# so scripts and the command line interface start without them
+
+
+def to_cents(amount):
+    """
+    Converts an amount in euros (int, float, str or Decimal) to integer cents, rounding half up.
+    Floats are converted through their shortest repr, so 0.1 becomes exactly 10 cents.
+    :return: int
+    """
+    try:
+        cents = (decimal.Decimal(str(amount)) * 100).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP)
+    except decimal.InvalidOperation:
+        raise ValueError(f"Invalid amount '{amount}'") from None
+    if not cents.is_finite():
+        raise ValueError(f"Invalid amount '{amount}'")
+    return int(cents)
+
+
+def from_cents(cents):
+    """
+    Converts integer cents to an exact Decimal amount in euros.
+    :return: Decimal
+    """
+    return decimal.Decimal(int(cents)).scaleb(-2)
+
+
+# Columns of read_transactions and read_expenses for the shared read layer
+TRANSACTION_COLUMNS = [('id', 'int'), ('category_name', 'category'), ('amount', 'cents'), ('date', 'date'),
+                       ('comment', 'text')]
+
+# Sort orders of the transaction table: the columns of the keyset, each backed by an index.
+# The transaction id always comes last, it makes the order unique. The values are the positions
+# of the columns in a row of fetch_transactions_page, for reading the keyset of the last row.
+PAGE_ORDERS = {
+    'date': (('t.date', 1),),
+    'amount': (('t.amount', 3),),
+    'category': (('c.name', 2), ('t.date', 1)),
+}
+# Sort key of a row of fetch_transactions_page in every order, for merging the archived rows into a page
+PAGE_KEYS = {
+    'date': operator.itemgetter(1, 0),
+    'amount': operator.itemgetter(3, 0),
+    'category': operator.itemgetter(2, 1, 0),
+}
+
+# Statements that recompute the daily_totals aggregate from the raw transactions
+REBUILD_DAILY_TOTALS = (
+    'DELETE FROM daily_totals',
+    '''INSERT INTO daily_totals (date, amount, count)
+        SELECT date, SUM(amount), COUNT(*) FROM transactions GROUP BY date''',
+)
+
+# Statements that recompute the running balances (overall and per category) from the raw transactions
+REBUILD_BALANCES = (
+    'DELETE FROM running_balance',
+    '''INSERT INTO running_balance (id, amount, count)
+        SELECT 1, COALESCE(SUM(amount), 0), COUNT(*) FROM transactions''',
+    'DELETE FROM category_balances',
+    '''INSERT INTO category_balances (category_id, amount, count)
+        SELECT category_id, SUM(amount), COUNT(*) FROM transactions GROUP BY category_id''',
+)
+
+# Triggers that keep daily_totals up to date
+DAILY_TOTALS_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_daily_totals_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO daily_totals (date, amount, count) VALUES (NEW.date, NEW.amount, 1)
+        ON CONFLICT (date) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_daily_totals_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE daily_totals SET amount = amount - OLD.amount, count = count - 1 WHERE date = OLD.date;
+    DELETE FROM daily_totals WHERE date = OLD.date AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_daily_totals_update AFTER UPDATE OF amount, date ON transactions
+BEGIN
+    UPDATE daily_totals SET amount = amount - OLD.amount, count = count - 1 WHERE date = OLD.date;
+    DELETE FROM daily_totals WHERE date = OLD.date AND count = 0;
+    INSERT INTO daily_totals (date, amount, count) VALUES (NEW.date, NEW.amount, 1)
+        ON CONFLICT (date) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+'''
+
+# Triggers that keep the running balances up to date
+BALANCE_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_balances_insert AFTER INSERT ON transactions
+BEGIN
+    UPDATE running_balance SET amount = amount + NEW.amount, count = count + 1 WHERE id = 1;
+    INSERT INTO category_balances (category_id, amount, count) VALUES (NEW.category_id, NEW.amount, 1)
+        ON CONFLICT (category_id) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_balances_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE running_balance SET amount = amount - OLD.amount, count = count - 1 WHERE id = 1;
+    UPDATE category_balances SET amount = amount - OLD.amount, count = count - 1
+        WHERE category_id = OLD.category_id;
+    DELETE FROM category_balances WHERE category_id = OLD.category_id AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_balances_update AFTER UPDATE OF amount, category_id ON transactions
+BEGIN
+    UPDATE running_balance SET amount = amount - OLD.amount + NEW.amount WHERE id = 1;
+    UPDATE category_balances SET amount = amount - OLD.amount, count = count - 1
+        WHERE category_id = OLD.category_id;
+    DELETE FROM category_balances WHERE category_id = OLD.category_id AND count = 0;
+    INSERT INTO category_balances (category_id, amount, count) VALUES (NEW.category_id, NEW.amount, 1)
+        ON CONFLICT (category_id) DO UPDATE SET amount = amount + excluded.amount, count = count + 1;
+END;
+'''
+
+# Triggers that invalidate the cached monthly rollups of every month a write touches
+ROLLUP_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_rollups_insert AFTER INSERT ON transactions
+BEGIN
+    DELETE FROM rollup_months WHERE month = substr(NEW.date, 1, 7);
+    DELETE FROM monthly_rollups WHERE month = substr(NEW.date, 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_rollups_delete AFTER DELETE ON transactions
+BEGIN
+    DELETE FROM rollup_months WHERE month = substr(OLD.date, 1, 7);
+    DELETE FROM monthly_rollups WHERE month = substr(OLD.date, 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_rollups_update AFTER UPDATE OF amount, date, category_id ON transactions
+BEGIN
+    DELETE FROM rollup_months WHERE month IN (substr(OLD.date, 1, 7), substr(NEW.date, 1, 7));
+    DELETE FROM monthly_rollups WHERE month IN (substr(OLD.date, 1, 7), substr(NEW.date, 1, 7));
+END;
+'''
+
+# Statements that add the summaries of the archived years (see Tracker.archive()) to rebuilt aggregates
+MERGE_ARCHIVED_DAILY_TOTALS = (
+    '''INSERT INTO daily_totals (date, amount, count)
+        SELECT date, amount, count FROM archived_daily_totals WHERE true
+        ON CONFLICT (date) DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count''',
+)
+MERGE_ARCHIVED_BALANCES = (
+    '''UPDATE running_balance SET amount = amount + (SELECT COALESCE(SUM(amount), 0) FROM archived_years),
+        count = count + (SELECT COALESCE(SUM(count), 0) FROM archived_years)
+        WHERE id = 1''',
+    '''INSERT INTO category_balances (category_id, amount, count)
+        SELECT category_id, SUM(income + expenses), SUM(count) FROM archived_rollups WHERE true GROUP BY category_id
+        ON CONFLICT (category_id) DO UPDATE SET amount = amount + excluded.amount, count = count + excluded.count''',
+)
+
+# Skips imported rows whose fingerprint belongs to an archived transaction, like the unique index does
+# for the live ones
+ARCHIVE_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_archived_fingerprints BEFORE INSERT ON transactions
+WHEN NEW.fingerprint IS NOT NULL
+    AND EXISTS (SELECT 1 FROM archived_fingerprints WHERE fingerprint = NEW.fingerprint)
+BEGIN
+    SELECT RAISE(IGNORE);
+END;
+'''
+
+# Id of the next new transaction. SQLite would give a new row the highest id in the table plus one, which can be
+# the id of an archived transaction, so new ids also stay above the archived ones. It is computed by the INSERT
+# itself: read by a statement of its own, another connection could take the id before the INSERT gets the write lock
+NEXT_ID = '''
+    (SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM transactions),
+                (SELECT COALESCE(MAX(last_id), 0) FROM archived_years)) + 1)'''
+
+# Rows per INSERT statement of Tracker.add_transactions()
+INSERT_CHUNK_SIZE = 50_000
+# Number of most recently added matches (highest ids) Tracker.search() ranks by relevance, the older ones follow
+# by id, latest first: the full-text index is ordered by id, its date order would cost a sort of all matches
+SEARCH_RANK_WINDOW = 1000
+
+# Statements that recompute the full-text search index from the transactions
+REBUILD_SEARCH_INDEX = (
+    'DELETE FROM transactions_fts',
+    '''INSERT INTO transactions_fts (rowid, comment, category)
+        SELECT t.id, t.comment, c.name FROM transactions t JOIN categories c ON c.id = t.category_id''',
+)
+
+# Triggers that keep the full-text search index (comment and category name per transaction id) in sync
+SEARCH_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_search_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, comment, category)
+        SELECT NEW.id, NEW.comment, name FROM categories WHERE id = NEW.category_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_delete AFTER DELETE ON transactions
+BEGIN
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_update AFTER UPDATE OF comment, category_id ON transactions
+BEGIN
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+    INSERT INTO transactions_fts (rowid, comment, category)
+        SELECT NEW.id, NEW.comment, name FROM categories WHERE id = NEW.category_id;
+END;
+'''
+
+# Columns of the period reports for the shared read layer
+REPORT_COLUMNS = [('period', 'text'), ('income', 'cents'), ('expenses', 'cents'), ('net', 'cents'),
+                  ('balance', 'cents')]
+CATEGORY_REPORT_COLUMNS = [('period', 'text'), ('category_name', 'category'), ('income', 'cents'),
+                           ('expenses', 'cents'), ('net', 'cents'), ('share', 'float')]
+
+# Schema migrations, applied in order. A migration's position in this list (starting at 1)
+# is the schema version it produces, which is stored in the database with PRAGMA user_version.
+# Never edit a migration that has been released - append a new one instead.
+MIGRATIONS = [
+    # 1: Indexes for the date range queries (graph, balance history) and the per-category lookups.
+    #    (date, amount) covers the SUM/GROUP BY date queries without touching the table itself.
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, amount);
+    CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions (category_id, date);
+    ''',
+    # 2: Fingerprint of imported statement rows, so importing the same row twice is a no-op.
+    #    Manually added transactions have no fingerprint (NULLs never collide in a UNIQUE index).
+    '''
+    ALTER TABLE transactions ADD COLUMN fingerprint TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions (fingerprint);
+    ''',
+    # 3: Sum and number of transactions per day, kept up to date by triggers. The balance history
+    #    reads at most one row per day from here instead of aggregating the raw transactions.
+    '''
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        date DATE PRIMARY KEY,
+        amount DECIMAL(10, 2) NOT NULL,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    ''' + ';\n'.join(REBUILD_DAILY_TOTALS) + ';\n' + DAILY_TOTALS_TRIGGERS,
+    # 4: Running balance, overall (a single row) and per category, kept up to date by triggers,
+    #    so reading the current balance doesn't scan the transactions.
+    '''
+    CREATE TABLE IF NOT EXISTS running_balance (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        amount DECIMAL(10, 2) NOT NULL,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS category_balances (
+        category_id INTEGER PRIMARY KEY,
+        amount DECIMAL(10, 2) NOT NULL,
+        count INTEGER NOT NULL
+    );
+    ''' + ';\n'.join(REBUILD_BALANCES) + ';\n' + BALANCE_TRIGGERS,
+    # 5: Index in (date, id) order for the keyset pagination of the transaction table
+    #    (the rowid is implicitly the last column of every index).
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_date_id ON transactions (date);
+    ''',
+    # 6: Index for sorting the transaction table by amount
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_amount ON transactions (amount);
+    ''',
+    # 7: Amounts as integer cents. SQLite stores DECIMAL(10, 2) as floating point, which drifts in long sums.
+    #    The update triggers are dropped while converting (the aggregates are rebuilt anyway), and the
+    #    aggregate tables are recreated with integer columns.
+    '''
+    DROP TRIGGER IF EXISTS trg_daily_totals_update;
+    DROP TRIGGER IF EXISTS trg_balances_update;
+    UPDATE transactions SET amount = CAST(ROUND(amount * 100) AS INTEGER);
+    DROP TABLE daily_totals;
+    CREATE TABLE daily_totals (
+        date DATE PRIMARY KEY,
+        amount INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    DROP TABLE running_balance;
+    CREATE TABLE running_balance (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        amount INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    );
+    DROP TABLE category_balances;
+    CREATE TABLE category_balances (
+        category_id INTEGER PRIMARY KEY,
+        amount INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    );
+    ''' + ';\n'.join(REBUILD_DAILY_TOTALS + REBUILD_BALANCES) + ';\n' + DAILY_TOTALS_TRIGGERS + BALANCE_TRIGGERS,
+    # 8: Cache of the monthly rollups (income and expenses per month and category) of closed months.
+    #    rollup_months lists the months whose rollups are stored; the triggers remove a month from both
+    #    tables when a write touches it, Tracker.update_rollups() stores it again.
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_rollups (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        income INTEGER NOT NULL,
+        expenses INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS rollup_months (
+        month TEXT PRIMARY KEY
+    ) WITHOUT ROWID;
+    ''' + ROLLUP_TRIGGERS,
+    # 9: Full-text search over the comments and category names. The index keeps its own copy of the text,
+    #    keyed by the transaction id; unicode61 with remove_diacritics finds 'cafe' in 'Café'.
+    #    The prefix indexes answer the prefix query of a partly typed word without merging every term
+    #    that starts with it.
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        comment, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+    );
+    ''' + ';\n'.join(REBUILD_SEARCH_INDEX) + ';\n' + SEARCH_TRIGGERS,
+    # 10: Archive of closed years (helper_archive). Their transactions move into columnar files next to the
+    #     database; the summaries per day and per month and category stay here, and the aggregates above
+    #     keep counting the archived transactions. archived_years.path names the directory of a year's files,
+    #     last_id its highest transaction id, new transactions get higher ids (see NEXT_ID).
+    '''
+    CREATE TABLE IF NOT EXISTS archived_years (
+        year TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        last_id INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS archived_daily_totals (
+        date DATE PRIMARY KEY,
+        amount INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS archived_rollups (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        income INTEGER NOT NULL,
+        expenses INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS archived_fingerprints (
+        fingerprint TEXT PRIMARY KEY,
+        year TEXT NOT NULL
+    ) WITHOUT ROWID;
+    ''' + ARCHIVE_TRIGGERS,
+]
+
+
+def _statements(script):
+    """
+    Splits an SQL script into its statements, so they can run inside an open transaction
+    (executescript() commits it first).
+    :param script: str, statements separated by semicolons, triggers included
+    :return: generator of str
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ''
+    if statement.strip():
+        yield statement
+
+
+def _match_expression(text):
+    """
+    FTS5 query for free text typed by the user: every word must occur (in the comment or the category name),
+    the last one as a prefix, so results appear while typing. Words are quoted, FTS5 operators and
+    punctuation in the input can't cause syntax errors. Parts without a letter or digit ('-', '!!!') are
+    dropped, the tokenizer finds no word in them, like helper_archive.
+    :param text: search text
+    :return: str, MATCH expression, empty if the text has no words
+    """
+    words = [word for word in text.split() if re.search(r'[^\W_]', word)]
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class Filter:
+    """
+    Composable criteria for transactions, compiled into a parameterized WHERE clause that SQLite answers
+    from the indexes (date, category and amount indexes, the full-text index for the comment), so only
+    matching rows leave the database. Unset criteria match everything, set ones are combined with AND.
+    A Filter doesn't change, replace() returns a copy with some criteria changed.
+    """
+
+    def __init__(self, start=None, end=None, categories=None, min_amount=None, max_amount=None, sign=None,
+                 text=None):
+        """
+        :param start: ISO date of the first day, None for the beginning
+        :param end: ISO date of the last day, None for no limit
+        :param categories: iterable of category names, None for all
+        :param min_amount: smallest amount in euros, signed (expenses are negative), None for no limit
+        :param max_amount: largest amount in euros, signed, None for no limit
+        :param sign: 'income' for positive amounts, 'expense' for negative ones, None for both
+        :param text: words that must occur in the comment, the last one as a prefix
+        """
+        if sign not in (None, 'income', 'expense'):
+            raise ValueError(f"Unknown sign '{sign}'")
+        self.start = datetime.date.fromisoformat(str(start)).isoformat() if start else None
+        self.end = datetime.date.fromisoformat(str(end)).isoformat() if end else None
+        self.categories = tuple(categories) if categories is not None else None
+        self.min_amount = from_cents(to_cents(min_amount)) if min_amount is not None else None
+        self.max_amount = from_cents(to_cents(max_amount)) if max_amount is not None else None
+        self.sign = sign
+        self.text = (text.strip() or None) if text else None
+
+    def criteria(self):
+        """
+        :return: dict of all criteria, as taken by the constructor
+        """
+        return {'start': self.start, 'end': self.end, 'categories': self.categories,
+                'min_amount': self.min_amount, 'max_amount': self.max_amount, 'sign': self.sign,
+                'text': self.text}
+
+    def replace(self, **changes):
+        """
+        :return: Filter with the given criteria changed, e.g. replace(sign='expense') or replace(text=None)
+        """
+        return Filter(**{**self.criteria(), **changes})
+
+    def __bool__(self):
+        return any(value is not None for value in self.criteria().values())
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and self.criteria() == other.criteria()
+
+    def __repr__(self):
+        return f"Filter({', '.join(f'{key}={value!r}' for key, value in self.criteria().items() if value is not None)})"
+
+    def conditions(self, alias='t'):
+        """
+        Compiles the criteria into SQL conditions on the transactions table.
+        :param alias: name of the transactions table in the query
+        :return: tuple (list of SQL conditions, list of parameters)
+        """
+        conditions = []
+        params = []
+        if self.start is not None:
+            conditions.append(f'{alias}.date >= ?')
+            params.append(self.start)
+        if self.end is not None:
+            conditions.append(f'{alias}.date <= ?')
+            params.append(self.end)
+        if self.categories is not None:
+            conditions.append(f'{alias}.category_id IN '
+                              f'(SELECT id FROM categories WHERE name IN (SELECT value FROM json_each(?)))')
+            params.append(json.dumps(list(self.categories)))
+        if self.min_amount is not None:
+            conditions.append(f'{alias}.amount >= ?')
+            params.append(to_cents(self.min_amount))
+        if self.max_amount is not None:
+            conditions.append(f'{alias}.amount <= ?')
+            params.append(to_cents(self.max_amount))
+        if self.sign is not None:
+            conditions.append(f"{alias}.amount {'>' if self.sign == 'income' else '<'} 0")
+        if self.text is not None:
+            match = _match_expression(self.text)
+            if match:
+                conditions.append(f'{alias}.id IN '
+                                  f'(SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)')
+                params.append(f'comment : ({match})')
+            else:
+                # A text without words matches nothing, like the full-text index
+                conditions.append('0')
+        return conditions, params
+
+    def where(self, alias='t', extra=()):
+        """
+        :param alias: name of the transactions table in the query
+        :param extra: further SQL conditions to combine with the criteria, without parameters
+        :return: tuple ('WHERE ...' or '' if nothing is filtered, list of parameters)
+        """
+        conditions, params = self.conditions(alias)
+        conditions = [*extra, *conditions]
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+
+def _period_days(period, start, end):
+    """
+    First and last day of a range of report periods.
+    :param period: 'month' or 'year'
+    :param start: first period, 'YYYY-MM' for months or 'YYYY' for years, None for no limit
+    :param end: last period, None for no limit
+    :return: tuple of ISO dates or None
+    """
+    if period == 'month':
+        first = f'{start}-01' if start else None
+        last = None
+        if end:
+            year, month = (int(part) for part in end.split('-'))
+            last = (datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)).isoformat()
+    elif period == 'year':
+        first = f'{start}-01-01' if start else None
+        last = f'{end}-12-31' if end else None
+    else:
+        raise ValueError(f"Unknown period '{period}'")
+    # Validates the input, a malformed period would silently select nothing
+    for day in (first, last):
+        if day is not None:
+            datetime.date.fromisoformat(day)
+    return first, last
+
+
+def _month_ranges(months):
+    """
+    SQL condition selecting the transactions of the given months by date ranges, so the date index is used.
+    :param months: list of 'YYYY-MM'
+    :return: tuple (condition, parameters)
+    """
+    params = []
+    for month in months:
+        year, number = (int(part) for part in month.split('-'))
+        params += [f'{month}-01', datetime.date(year + number // 12, number % 12 + 1, 1).isoformat()]
+    return ' OR '.join(['(date >= ? AND date < ?)'] * len(months)), params
+
 
 class Tracker:
-    def __init__(self):
-        self.connection = sqlite3.connect('example.db')
+    def __init__(self, db_path='example.db', read_only=False, connection=None):
+        """
+        Opens the database, creates and migrates the schema and adds the seed data if it is empty.
+        Use helper_connections.ConnectionManager to share one database between threads.
+        :param db_path: path of the SQLite database file
+        :param read_only: open a read-only connection without touching the schema, e.g. for reading
+            from another thread while the main Tracker writes
+        :param connection: an open sqlite3 connection to use instead of opening one with
+            helper_connections.connect (WAL, busy timeout)
+        """
+        self.db_path = db_path
+        self.read_only = read_only
+        # Not bound to the opening thread, so the owner can close it; only one thread may use it at a time
+        self.connection = connection or helper_connections.connect(db_path, read_only)
         self.cursor = self.connection.cursor()
+        # Number of open batch() blocks; writes only commit when no batch is open
+        self._batch_depth = 0
+        # Category name -> id, loaded on first use and kept in sync by add_category and del_category
+        self._category_ids = None
+        # Number of commits through this Tracker, part of data_version()
+        self._commits = 0
+        # helper_stats.Stats while instrumentation is enabled, see enable_stats()
+        self.stats = None
+        self._timed_methods = []
+        # helper_archive.Archive with the open files of the archived years, opened on first use
+        self._archive_store = None
+        if read_only:
+            return
+
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS categories (
             id INTEGER PRIMARY KEY,
@@ -15,6 +550,7 @@ class Tracker:
         )
         ''')
 
+        # The original schema, MIGRATIONS bring it up to date. Since schema version 7 amount holds cents.
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS transactions (
             id INTEGER PRIMARY KEY,
@@ -26,76 +562,367 @@ class Tracker:
         )
         ''')
         self.connection.commit()
+        self.migrate()
+
+        with self.batch():
+            # Existence probes, reading the tables would cost as much as the history is long
+            self.cursor.execute('SELECT 1 FROM categories WHERE id != 1 LIMIT 1')
+            if self.cursor.fetchone() is None:
+                self.add_category('Income')
+                self.add_category('Rent')
+                self.add_category('Food')
+                self.add_category('Coffee')
+            self.cursor.execute('''
+                SELECT 1 FROM transactions t JOIN categories c ON t.category_id = c.id
+                WHERE c.name != 'Income'
+                UNION ALL SELECT 1 FROM archived_years
+                LIMIT 1
+            ''')
+            if self.cursor.fetchone() is None:
+                self.add_transaction('Income', 0, str(datetime.date.today()), 'Start Value')
+                self.add_transaction('Rent', 0, str(datetime.date.today()), 'Start Value')
+                self.add_transaction('Food', 0, str(datetime.date.today()), 'Start Value')
+                self.add_transaction('Coffee', 0, str(datetime.date.today()), 'Start Value')
+
+    def schema_version(self):
+        """
+        Reads the schema version of the database.
+        :return: int
+        """
+        self.cursor.execute('PRAGMA user_version')
+        return self.cursor.fetchone()[0]
+
+    def migrate(self):
+        """
+        Applies all migrations the database has not seen yet, each one in its own transaction.
+        Every step takes the write lock first (BEGIN IMMEDIATE) and reads the version again under it, so when
+        two processes open an old database at the same time, the second one skips the steps the first one applied.
+        :return: int, schema version after migrating
+        """
+        version = self.schema_version()
+        if version >= len(MIGRATIONS):
+            return version
+        # Without isolation_level the sqlite3 module doesn't open or commit transactions on its own
+        isolation_level = self.connection.isolation_level
+        self.connection.isolation_level = None
+        try:
+            while True:
+                self.cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    version = self.schema_version()
+                    if version >= len(MIGRATIONS):
+                        self.cursor.execute('COMMIT')
+                        return version
+                    for statement in _statements(MIGRATIONS[version]):
+                        self.cursor.execute(statement)
+                    self.cursor.execute(f'PRAGMA user_version = {version + 1}')
+                    self.cursor.execute('COMMIT')
+                except sqlite3.Error:
+                    if self.connection.in_transaction:
+                        self.cursor.execute('ROLLBACK')
+                    raise
+        finally:
+            self.connection.isolation_level = isolation_level
 
-        if self.read_categories().empty:
-            self.add_category('Income')
-            self.add_category('Rent')
-            self.add_category('Food')
-            self.add_category('Coffee')
-        if self.read_expenses().empty:
-            self.add_transaction('Income', 0, str(datetime.date.today()), 'Start Value')
-            self.add_transaction('Rent', 0, str(datetime.date.today()), 'Start Value')
-            self.add_transaction('Food', 0, str(datetime.date.today()), 'Start Value')
-            self.add_transaction('Coffee', 0, str(datetime.date.today()), 'Start Value')
+    def _commit(self):
+        """
+        Commits the pending writes, unless a batch is open - the batch commits them when it ends.
+        """
+        if not self._batch_depth:
+            self.connection.commit()
+            self._commits += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups all writes inside the with-block into one transaction with a single commit.
+        Batches can be nested, only the outermost one commits. On an exception all writes of the batch
+        are rolled back.
+
+            with tracker.batch():
+                tracker.add_transaction('Food', -12.5, '2024-12-01')
+                tracker.add_transaction('Rent', -800, '2024-12-01')
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.connection.rollback()
+                # The batch may have added or deleted categories that are gone again now
+                self._category_ids = None
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self.connection.commit()
+            self._commits += 1
+
+    def data_version(self):
+        """
+        A value that changes whenever the data changes: the number of commits through this Tracker plus
+        SQLite's data_version, which changes when another connection or process commits.
+        Compare it with an earlier value to find out if cached results are still valid.
+        :return: tuple
+        """
+        self.cursor.execute('PRAGMA data_version')
+        return self._commits, self.cursor.fetchone()[0]
+
+    def _categories(self):
+        """
+        Returns the cached mapping of category names to ids, reading it from the database on first use.
+        :return: dict
+        """
+        if self._category_ids is None:
+            self.cursor.execute('SELECT name, id FROM categories ORDER BY id')
+            self._category_ids = dict(self.cursor.fetchall())
+        return self._category_ids
+
+    def category_names(self):
+        """
+        Names of the user categories (without 'Income'), from the cache.
+        :return: list
+        """
+        return [name for name, category_id in self._categories().items() if category_id != 1]
 
     def find_id_of_category(self, category_name):
-        self.cursor.execute('SELECT id FROM categories WHERE name = ?', (category_name,))
-        category_id = self.cursor.fetchone()
-        if not category_id[0]:
+        category_id = self._categories().get(category_name)
+        if category_id is None:
+            from tkinter import messagebox
             messagebox.showerror("Error", "Unknown Category")
-            return
-        else:
-            return category_id[0]
+        return category_id
 
     def add_transaction(self, category_name, amount, date, comment=""):
         category_id = self.find_id_of_category(category_name)
-        self.cursor.execute('INSERT INTO transactions (category_id, amount, date, comment)'
-                            'VALUES (?, ?, ?, ?)', (category_id, amount, date, comment))
-        self.connection.commit()
+        if category_id is None:
+            return
+        self.cursor.execute(f'INSERT INTO transactions (id, category_id, amount, date, comment) '
+                            f'VALUES ({NEXT_ID}, ?, ?, ?, ?)', (category_id, to_cents(amount), date, comment))
+        self._commit()
+
+    def add_transactions(self, transactions):
+        """
+        Adds many transactions with one INSERT per INSERT_CHUNK_SIZE rows and a single commit.
+        Invalid rows are skipped and reported, the valid rest of the batch is still written.
+        Rows with a fingerprint that is already stored are skipped silently.
+        :param transactions: iterable of (category_name, amount, date), (category_name, amount, date, comment)
+            or (category_name, amount, date, comment, fingerprint)
+        :return: tuple (number of inserted rows, list of (row index, error message))
+        """
+        category_ids = self._categories()
+        rows = []
+        errors = []
+        for index, transaction in enumerate(transactions):
+            try:
+                category_name, amount, date, *optional = transaction
+                comment = optional[0] if optional else None
+                fingerprint = optional[1] if len(optional) > 1 else None
+                category_id = category_ids.get(category_name)
+                if category_id is None:
+                    raise ValueError(f"Unknown Category '{category_name}'")
+                amount = to_cents(amount)
+                date = datetime.date.fromisoformat(str(date)).isoformat()
+            except (TypeError, ValueError) as error:
+                errors.append((index, str(error)))
+                continue
+            rows.append((category_id, amount, date, comment if comment is not None else "", fingerprint))
+
+        # One statement per chunk instead of executemany: the full-text index flushes its pending terms at the
+        # end of every statement, so a statement per row would write an index segment per row
+        inserted = 0
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            # Only a known fingerprint skips a row, any other conflict (e.g. on the id) fails the statement.
+            # WHERE true keeps SQLite from reading ON CONFLICT as the join constraint of the SELECT
+            self.cursor.execute(f'''
+                INSERT INTO transactions (id, category_id, amount, date, comment, fingerprint)
+                SELECT {NEXT_ID} + key, json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+                       json_extract(value, '$[2]'), json_extract(value, '$[3]'), json_extract(value, '$[4]')
+                FROM json_each(?) WHERE true
+                ON CONFLICT (fingerprint) DO NOTHING
+            ''', (json.dumps(rows[start:start + INSERT_CHUNK_SIZE]),))
+            inserted += self.cursor.rowcount
+        self._commit()
+        return inserted, errors
 
     def del_transaction(self, trans_id):
         trans_id = int(trans_id)
         self.cursor.execute('DELETE FROM transactions WHERE id = ?', (trans_id,))
-        self.connection.commit()
+        self._commit()
+
+    def del_transactions(self, trans_ids):
+        """
+        Deletes many transactions with one statement and a single commit.
+        The ids are passed as one JSON array, so there is no limit on the number of ids.
+        :param trans_ids: iterable of transaction ids
+        :return: int, number of deleted transactions
+        """
+        trans_ids = [int(trans_id) for trans_id in trans_ids]
+        self.cursor.execute('DELETE FROM transactions WHERE id IN (SELECT value FROM json_each(?))',
+                            (json.dumps(trans_ids),))
+        deleted = self.cursor.rowcount
+        self._commit()
+        return deleted
 
     def add_category(self, category_name):
         self.cursor.execute('INSERT INTO categories (name) VALUES (?)', (category_name,))
-        self.connection.commit()
+        self._categories()[category_name] = self.cursor.lastrowid
+        self._commit()
 
     def del_category(self, category_name):
         category_id = self.find_id_of_category(category_name)
-        self.cursor.execute('SELECT * FROM transactions WHERE category_id = ?', (category_id,))
+        if category_id is None:
+            return
+        self.cursor.execute('''
+            SELECT 1 FROM transactions WHERE category_id = ?
+            UNION ALL SELECT 1 FROM archived_rollups WHERE category_id = ?
+            LIMIT 1
+        ''', (category_id, category_id))
         transaction = self.cursor.fetchone()
         if not transaction:
-            self.cursor.execute('DELETE FROM categories WHERE name = ?', (category_name,))
-            self.connection.commit()
+            self.cursor.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+            del self._categories()[category_name]
+            self._commit()
         else:
+            from tkinter import messagebox
             messagebox.showerror("Error", "Category is still in use!")
 
-    def read_categories(self):
+    def _read(self, query, kinds, params=(), as_array=False):
+        """
+        Runs a query through the shared read layer, see helper_read.
+        :param kinds: list of (column name, kind) for the selected columns
+        :return: DataFrame or NumPy structured array
+        """
+        import helper_read
+
+        # Read fresh instead of from the cache, another connection may have added categories
+        self.cursor.execute('SELECT id, name FROM categories')
+        category_names = dict(self.cursor.fetchall())
+        self.cursor.execute(query, params)
+        return helper_read.read(self.cursor, kinds, category_names, as_array)
+
+    def _archive(self):
+        """
+        The archive of the database (see archive()) and the directories of its years.
+        :return: tuple (helper_archive.Archive or None if no year is archived, list of directory names, oldest first)
+        """
+        self.cursor.execute('SELECT path FROM archived_years ORDER BY year')
+        names = [path for path, in self.cursor.fetchall()]
+        if not names:
+            return None, []
+        import helper_archive
+
+        if self._archive_store is None:
+            self._archive_store = helper_archive.Archive(helper_archive.archive_directory(self.db_path))
+        # Another connection may have archived or restored a year since the last read
+        self._archive_store.forget(names)
+        return self._archive_store, names
+
+    def _archived_rows(self, filter_by=None, start=None, end=None, exclude_income=False, text=()):
+        """
+        Archived transactions that match a filter and a date range.
+        :param start: ISO date of the first day, combined with the filter's range
+        :param end: ISO date of the last day, combined with the filter's range
+        :param exclude_income: skip the transactions of the Income category
+        :param text: text columns to read, e.g. ('comment',)
+        :return: dict, column name -> array of the matching rows (see helper_archive.Archive.select),
+            None if nothing is archived
+        """
+        archive, names = self._archive()
+        if archive is None:
+            return None
+        filter_by = filter_by or Filter()
+        if start is not None and (filter_by.start is None or str(start) > filter_by.start):
+            filter_by = filter_by.replace(start=start)
+        if end is not None and (filter_by.end is None or str(end) < filter_by.end):
+            filter_by = filter_by.replace(end=end)
+        self.cursor.execute('SELECT name, id FROM categories')
+        category_ids = dict(self.cursor.fetchall())
+        return archive.select(names, filter_by, category_ids,
+                              category_ids.get('Income') if exclude_income else None, text)
+
+    def _archived_sums(self, key, filter_by=None, start=None, end=None):
+        """
+        Sums of the archived transactions that match a filter and a date range, grouped by a column, as a
+        query to combine with UNION ALL with the same aggregation over the transactions table.
+        :param key: 'date' or 'category_id'
+        :return: tuple (SQL selecting key and amount, or '' if nothing is archived, list of parameters)
+        """
+        import numpy as np
+
+        rows = self._archived_rows(filter_by, start, end)
+        if rows is None:
+            return '', []
+        values, groups = np.unique(rows[key], return_inverse=True)
+        sums = np.zeros(len(values), dtype=np.int64)
+        np.add.at(sums, groups, rows['amount'])
+        values = np.datetime_as_string(values, unit='D') if key == 'date' else values
+        query = f'''SELECT json_extract(value, '$[0]') AS {key}, json_extract(value, '$[1]') AS amount
+                    FROM json_each(?)'''
+        return query, [json.dumps(list(zip(values.tolist(), sums.tolist())))]
+
+    def archived_ids(self, trans_ids):
+        """
+        Finds the archived transactions among some ids, they can't be changed or deleted until their year
+        is restored.
+        :param trans_ids: iterable of transaction ids
+        :return: set of int
+        """
+        archive, names = self._archive()
+        if archive is None:
+            return set()
+        return archive.contains(names, trans_ids)
+
+    def _read_transactions(self, query, params, as_array, filter_by, expenses):
+        """
+        Runs a query over the transactions through the shared read layer and puts the matching archived
+        transactions in front of its rows.
+        :param expenses: read expenses, like read_expenses(): without Income, amounts negated
+        :return: DataFrame or NumPy structured array with the TRANSACTION_COLUMNS
+        """
+        import numpy as np
+
+        import helper_read
+
+        self.cursor.execute('SELECT id, name FROM categories')
+        category_names = dict(self.cursor.fetchall())
+        archived = self._archived_rows(filter_by, exclude_income=expenses, text=('comment',))
+        self.cursor.execute(query, params)
+        columns, categories = helper_read.fetch_columns(self.cursor, TRANSACTION_COLUMNS, category_names)
+        if archived is not None and len(archived['id']):
+            if expenses:
+                archived['amount'] = -archived['amount']
+            archived = self._archive_store.to_columns(archived, TRANSACTION_COLUMNS, category_names)
+            columns = {name: np.concatenate([archived[name], column]) for name, column in columns.items()}
+        if as_array:
+            return helper_read.to_records(columns, categories)
+        return helper_read.to_frame(columns, categories)
+
+    def read_categories(self, as_array=False):
         """
         Reads the categories table.
+        :param as_array: return a NumPy structured array instead of a DataFrame
         :return: DataFrame
         """
         query = '''
-            SELECT * FROM categories
+            SELECT id, name FROM categories
             WHERE id != 1
         '''
-        self.cursor.execute(query)
-        rows = self.cursor.fetchall()
-        column_names = [desc[0] for desc in self.cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
-        return df
+        return self._read(query, [('id', 'int'), ('name', 'text')], as_array=as_array)
 
-    def read_transactions(self):
+    def read_transactions(self, as_array=False, filter_by=None):
         """
         Fetch all transactions joined with categories and return as a pandas DataFrame.
+        Columns: id, category_name (categorical), amount (euros), date (datetime64), comment
+        Archived transactions are included, they come first.
+        :param as_array: return a NumPy structured array instead of a DataFrame
+        :param filter_by: Filter, only matching transactions are read
         :return: DataFrame
         """
-        query = '''
+        where, params = (filter_by or Filter()).where()
+        query = f'''
                     SELECT 
                         t.id, 
-                        c.name AS category_name, 
+                        t.category_id,
                         t.amount AS amount,
                         t.date, 
                         t.comment
@@ -103,113 +930,874 @@ class Tracker:
                         transactions t
                     JOIN 
                         categories c ON t.category_id = c.id
+                    {where}
                 '''
-        self.cursor.execute(query)
-        rows = self.cursor.fetchall()
-        # Get column names from the query result
-        column_names = [desc[0] for desc in self.cursor.description]
-        # Create a pandas DataFrame
-        df = pd.DataFrame(rows, columns=column_names)
-        return df
+        return self._read_transactions(query, params, as_array, filter_by, expenses=False)
+
+    def fetch_transactions_page(self, after=None, limit=200, order_by='date', descending=True, filter_by=None):
+        """
+        Fetches one page of transactions joined with categories, sorted by an indexed column.
+        Keyset pagination: the page starts right after the row `after`, so every page costs the same
+        no matter how deep the user has scrolled. Archived transactions are merged into the pages.
+        :param after: last row of the previous page, None for the first page
+        :param limit: number of rows per page
+        :param order_by: 'date', 'amount' or 'category', ties are ordered by date and id
+        :param descending: sort direction
+        :param filter_by: Filter, only matching transactions are paged through
+        :return: list of (id, date, category_name, amount as Decimal, comment)
+        """
+        conditions, params = (filter_by or Filter()).conditions()
+        columns = [column for column, _ in PAGE_ORDERS[order_by]] + ['t.id']
+        direction = 'DESC' if descending else 'ASC'
+        query = f'''
+            SELECT t.id, t.date, c.name AS category_name, t.amount, t.comment
+            FROM transactions t
+            JOIN categories c ON t.category_id = c.id
+            {{where}}
+            ORDER BY {', '.join(f'{column} {direction}' for column in columns)}
+            LIMIT ?
+        '''
+        if after is not None:
+            # The rows carry euros, the table cents
+            key = [to_cents(after[position]) if column == 't.amount' else after[position]
+                   for column, position in PAGE_ORDERS[order_by]] + [after[0]]
+            conditions.append(f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join('?' * len(key))})")
+            params += key
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        self.cursor.execute(query.format(where=where), (*params, limit))
+        rows = [(trans_id, date, category_name, from_cents(amount), comment)
+                for trans_id, date, category_name, amount, comment in self.cursor.fetchall()]
+
+        archive, names = self._archive()
+        if archive is None:
+            return rows
+        # The page of the archive in the same order, both pages start after the same row
+        key = PAGE_KEYS[order_by](after) if after is not None else None
+        if key is not None and order_by == 'amount':
+            # The rows carry euros, the archive cents
+            key = (to_cents(key[0]), key[1])
+        self.cursor.execute('SELECT id, name FROM categories')
+        category_names = dict(self.cursor.fetchall())
+        archived = [(trans_id, date, category_name, from_cents(amount), comment)
+                    for trans_id, date, category_name, amount, comment
+                    in archive.page(names, order_by, key, limit, descending, filter_by, category_names)]
+        return sorted(rows + archived, key=PAGE_KEYS[order_by], reverse=descending)[:limit]
 
-    def read_expenses(self):
+    def read_expenses(self, as_array=False, filter_by=None):
         """
         Fetch all transactions (except Income) joined with categories and return as a pandas DataFrame.
-        Columns: transaction_id, category_name, amount, date, comment
+        Columns: id, category_name (categorical), amount (euros spent, a refund is negative), date (datetime64),
+        comment. The amounts of a category add up to its total in expenses_by_category().
+        Archived transactions are included, they come first.
+        :param as_array: return a NumPy structured array instead of a DataFrame
+        :param filter_by: Filter, only matching transactions are read
         :return: DataFrame
         """
-        query = '''
+        where, params = (filter_by or Filter()).where(extra=["c.name != 'Income'"])
+        query = f'''
             SELECT 
                 t.id, 
-                c.name AS category_name, 
-                ABS(t.amount) AS amount,
+                t.category_id,
+                -t.amount AS amount,
                 t.date, 
                 t.comment
             FROM 
                 transactions t
             JOIN 
                 categories c ON t.category_id = c.id
-            WHERE 
-                c.name != 'Income';
+            {where}
         '''
-        self.cursor.execute(query)
-        rows = self.cursor.fetchall()
-        # Get column names from the query result
-        column_names = [desc[0] for desc in self.cursor.description]
-        # Create a pandas DataFrame
-        df = pd.DataFrame(rows, columns=column_names)
-        return df
+        return self._read_transactions(query, params, as_array, filter_by, expenses=True)
 
-    def fetch_transactions_last_n_days(self, n_days=30):
+    def expenses_by_category(self, start=None, end=None, categories=None, as_array=False, filter_by=None):
         """
-        Gets the transactions for the last n_days
-        :param n_days: variable to change span of transactions
-        :return: list
+        Total spending per category (except Income), aggregated by SQLite, smallest first: the payments minus
+        the refunds, the sum of the category's amounts in read_expenses(). A category whose refunds exceed its
+        payments spent nothing, its total is 0.
+        Without a date range or filter the totals come from the running category balances,
+        so no transaction is read. Archived transactions are included.
+        :param start: ISO date of the first day, None for the beginning of the history
+        :param end: ISO date of the last day, None for no limit
+        :param categories: iterable of category names to include, None for all
+        :param as_array: return a NumPy structured array instead of a DataFrame
+        :param filter_by: Filter, only matching transactions are summed (combined with the other arguments)
+        :return: DataFrame with the columns category_name and amount, one row per category
         """
-        # Fetch all transactions within the last n_days
+        params = []
+        if start is None and end is None and not filter_by:
+            source = 'category_balances'
+        else:
+            date_conditions = []
+            if start is not None:
+                date_conditions.append('t.date >= ?')
+                params.append(start)
+            if end is not None:
+                date_conditions.append('t.date <= ?')
+                params.append(end)
+            where, filter_params = (filter_by or Filter()).where(extra=date_conditions)
+            params += filter_params
+            source = f'''
+                SELECT t.category_id AS category_id, SUM(t.amount) AS amount
+                FROM transactions t
+                {where}
+                GROUP BY t.category_id
+            '''
+            archived, archived_params = self._archived_sums('category_id', filter_by, start, end)
+            if archived:
+                source = f'''
+                    SELECT category_id, SUM(amount) AS amount FROM ({source} UNION ALL {archived})
+                    GROUP BY category_id
+                '''
+                params += archived_params
+            source = f'({source})'
+
+        conditions = ["c.name != 'Income'"]
+        if categories is not None:
+            conditions.append('c.name IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(list(categories)))
+
+        query = f'''
+            SELECT c.name AS category_name, MAX(-totals.amount, 0) AS amount
+            FROM {source} totals
+            JOIN categories c ON totals.category_id = c.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY amount
+        '''
+        return self._read(query, [('category_name', 'text'), ('amount', 'cents')], params, as_array)
+
+    def fetch_daily_totals(self, start=None, end=None):
+        """
+        Gets the daily sums of the transactions between start and end (both included)
+        :param start: ISO date of the first day, None for the beginning of the history
+        :param end: ISO date of the last day, None for no limit
+        :return: list of (date, daily_amount)
+        """
+        return [(date, from_cents(amount)) for date, amount in self._daily_totals_cents(start, end)]
+
+    def _daily_totals_cents(self, start=None, end=None):
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('date <= ?')
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
         query = f'''
-        SELECT date, SUM(amount) as daily_amount
-        FROM transactions
-        WHERE date >= DATE('now', '-{n_days} day')
-        GROUP BY date
+        SELECT date, amount AS daily_amount
+        FROM daily_totals
+        {where}
         ORDER BY date;
         '''
-        self.cursor.execute(query)
+        self.cursor.execute(query, params)
         rows = self.cursor.fetchall()
         return rows
 
-    def balance_before_n_days(self, n_days=30):
+    def balance_before(self, date):
         """
-        Sums all transactions before n_days
-        :param n_days: variable to change span of transactions
-        :return: int
+        Sums all transactions before the given day
+        :param date: ISO date
+        :return: Decimal
         """
-        query = f'''
+        return from_cents(self._balance_before_cents(date))
+
+    def _balance_before_cents(self, date):
+        query = '''
                 SELECT SUM(amount) AS balance
-                FROM transactions
-                WHERE date <= DATE('now', '-{n_days} days');
+                FROM daily_totals
+                WHERE date < ?;
                 '''
-        self.cursor.execute(query)
+        self.cursor.execute(query, (date,))
         result = self.cursor.fetchone()
         balance = result[0] if result[0] is not None else 0  # Handle NULL case
         return balance
 
-    def calculate_daily_balance(self, n_days=30):
+    def fetch_transactions_last_n_days(self, n_days=30):
         """
-        Calculates the daily balance for last n_days counting from today
+        Gets the daily sums of the transactions for the last n_days
         :param n_days: variable to change span of transactions
-        :return: DataFrame
+        :return: list
         """
-        transactions = self.fetch_transactions_last_n_days(n_days)
-        if not transactions:
-            return pd.DataFrame(columns=['date', 'balance'])
+        start = datetime.date.today() - datetime.timedelta(days=n_days)
+        return self.fetch_daily_totals(start.isoformat())
 
-        # Start calculating the cumulative balance
-        balance = self.balance_before_n_days(n_days)
-        balances = []
+    def balance_before_n_days(self, n_days=30):
+        """
+        Sums all transactions before n_days
+        :param n_days: variable to change span of transactions
+        :return: Decimal
+        """
+        start = datetime.date.today() - datetime.timedelta(days=n_days)
+        return self.balance_before(start.isoformat())
 
-        for date, daily_amount in transactions:
-            balance += daily_amount  # Cumulative sum of daily transactions
-            balances.append((date, balance))
+    def calculate_daily_balance(self, n_days=30, start=None, end=None, filter_by=None):
+        """
+        Calculates the daily balance for last n_days counting from today, or for a custom range
+        :param n_days: variable to change span of transactions, None for the whole history
+        :param start: ISO date of the first day of a custom range, replaces n_days
+        :param end: ISO date of the last day of a custom range, None for today
+        :param filter_by: Filter, the balance of the matching transactions only; summed from the
+            transactions (and the archived ones) instead of the daily totals
+        :return: DataFrame with the columns date (datetime64) and balance
+        """
+        import helper_read
+
+        if start is None and n_days is not None:
+            start = (datetime.date.today() - datetime.timedelta(days=n_days)).isoformat()
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('date <= ?')
+            params.append(end)
+        if filter_by:
+            # Same date conditions on the transactions, t.date is covered by the date index
+            where, filter_params = filter_by.where(extra=[f't.{condition}' for condition in conditions])
+            query = f'SELECT t.date AS date, SUM(t.amount) AS amount FROM transactions t {where} GROUP BY t.date'
+            archived, archived_params = self._archived_sums('date', filter_by, start, end)
+            if archived:
+                query = f'SELECT date, SUM(amount) FROM ({query} UNION ALL {archived}) GROUP BY date'
+            self.cursor.execute(f'{query} ORDER BY date', params + filter_params + archived_params)
+        else:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            self.cursor.execute(f'SELECT date, amount FROM daily_totals {where} ORDER BY date', params)
+        columns, _ = helper_read.fetch_columns(self.cursor, [('date', 'date'), ('balance', 'int')])
 
-        # Convert to a pandas DataFrame for easy plotting
-        df = pd.DataFrame(balances, columns=['date', 'balance'])
-        return df
+        # Opening balance plus the cumulative sum of the daily totals, summed exactly in cents
+        opening = 0
+        if start is not None and filter_by:
+            where, filter_params = filter_by.where(extra=['t.date < ?'])
+            self.cursor.execute(f'SELECT COALESCE(SUM(t.amount), 0) FROM transactions t {where}',
+                                [start] + filter_params)
+            opening = self.cursor.fetchone()[0]
+            day_before = (datetime.date.fromisoformat(str(start)) - datetime.timedelta(days=1)).isoformat()
+            archived = self._archived_rows(filter_by, end=day_before)
+            if archived is not None:
+                opening += int(archived['amount'].sum())
+        elif start is not None:
+            opening = self._balance_before_cents(start)
+        columns['balance'] = (columns['balance'].cumsum() + opening) / 100
+        return helper_read.to_frame(columns, {})
+
+    def verify_daily_totals(self):
+        """
+        Compares the daily_totals aggregate with the raw transactions plus the sums of the archived ones.
+        :return: list of (date, stored amount, stored count, actual amount, actual count) for every wrong day
+        """
+        self.cursor.execute('SELECT date, amount, count FROM daily_totals')
+        stored = {date: (amount, count) for date, amount, count in self.cursor.fetchall()}
+        self.cursor.execute('''
+            SELECT date, SUM(amount), SUM(count) FROM (
+                SELECT date, SUM(amount) AS amount, COUNT(*) AS count FROM transactions GROUP BY date
+                UNION ALL SELECT date, amount, count FROM archived_daily_totals
+            )
+            GROUP BY date
+        ''')
+        actual = {date: (amount, count) for date, amount, count in self.cursor.fetchall()}
+
+        mismatches = []
+        for date in sorted(stored.keys() | actual.keys()):
+            stored_amount, stored_count = stored.get(date, (0, 0))
+            actual_amount, actual_count = actual.get(date, (0, 0))
+            if stored_count != actual_count or stored_amount != actual_amount:
+                mismatches.append((date, from_cents(stored_amount), stored_count,
+                                   from_cents(actual_amount), actual_count))
+        return mismatches
+
+    def rebuild_search_index(self):
+        """
+        Recomputes the full-text search index from the transactions and categories.
+        """
+        with self.batch():
+            for statement in REBUILD_SEARCH_INDEX:
+                self.cursor.execute(statement)
+
+    def rebuild_daily_totals(self):
+        """
+        Recomputes the daily_totals aggregate from the raw transactions and the sums of the archived ones.
+        """
+        with self.batch():
+            for statement in REBUILD_DAILY_TOTALS + MERGE_ARCHIVED_DAILY_TOTALS:
+                self.cursor.execute(statement)
 
     def balance(self):
         """
-        Sum all transactions to get current balance
-        :return: int
+        Current balance, read from the running balance that the triggers keep up to date
+        :return: Decimal
+        """
+        self.cursor.execute('SELECT amount FROM running_balance WHERE id = 1')
+        result = self.cursor.fetchone()
+        balance = result[0] if result is not None else 0  # Handle empty table
+        return from_cents(balance)
+
+    def category_balances(self):
+        """
+        Current balance of every category that has transactions
+        :return: dict, category name -> Decimal balance
         """
         query = '''
-            SELECT SUM(amount) FROM transactions
+            SELECT c.name, b.amount
+            FROM category_balances b
+            JOIN categories c ON b.category_id = c.id
         '''
         self.cursor.execute(query)
-        result = self.cursor.fetchone()
-        balance = round(result[0], 2) if result[0] is not None else 0  # Handle NULL case
-        return balance
+        return {name: from_cents(amount) for name, amount in self.cursor.fetchall()}
+
+    def verify_balances(self):
+        """
+        Compares the running balances with a full scan of the transactions plus the sums of the archived ones.
+        :return: list of (category id or 'total', stored amount, actual amount) for every wrong balance
+        """
+        self.cursor.execute('SELECT amount, count FROM running_balance WHERE id = 1')
+        stored = {'total': self.cursor.fetchone() or (0, 0)}
+        self.cursor.execute('SELECT category_id, amount, count FROM category_balances')
+        stored.update((category_id, (amount, count)) for category_id, amount, count in self.cursor.fetchall())
+
+        self.cursor.execute('''
+            SELECT (SELECT COALESCE(SUM(amount), 0) FROM transactions)
+                       + (SELECT COALESCE(SUM(amount), 0) FROM archived_years),
+                   (SELECT COUNT(*) FROM transactions) + (SELECT COALESCE(SUM(count), 0) FROM archived_years)
+        ''')
+        actual = {'total': self.cursor.fetchone()}
+        self.cursor.execute('''
+            SELECT category_id, SUM(amount), SUM(count) FROM (
+                SELECT category_id, SUM(amount) AS amount, COUNT(*) AS count FROM transactions GROUP BY category_id
+                UNION ALL SELECT category_id, income + expenses, count FROM archived_rollups
+            )
+            GROUP BY category_id
+        ''')
+        actual.update((category_id, (amount, count)) for category_id, amount, count in self.cursor.fetchall())
+
+        mismatches = []
+        for key in stored.keys() | actual.keys():
+            stored_amount, stored_count = stored.get(key, (0, 0))
+            actual_amount, actual_count = actual.get(key, (0, 0))
+            if stored_count != actual_count or stored_amount != actual_amount:
+                mismatches.append((key, from_cents(stored_amount), from_cents(actual_amount)))
+        return mismatches
+
+    def rebuild_balances(self):
+        """
+        Recomputes the running balances from the raw transactions and the sums of the archived ones.
+        """
+        with self.batch():
+            for statement in REBUILD_BALANCES + MERGE_ARCHIVED_BALANCES:
+                self.cursor.execute(statement)
+
+    def _remove_unused_archive_files(self):
+        """
+        Deletes the directories of the archive that no committed year uses anymore: generations replaced or
+        restored by an earlier run, and '.tmp' directories of a run that crashed.
+        """
+        import shutil
+
+        import helper_archive
+
+        directory = helper_archive.archive_directory(self.db_path)
+        if not os.path.isdir(directory):
+            return
+        self.cursor.execute('SELECT path FROM archived_years')
+        used = {path for path, in self.cursor.fetchall()}
+        for name in os.listdir(directory):
+            if name not in used:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def archive(self, until_year=None):
+        """
+        Moves the transactions of closed years out of the transactions table into the archive: compact
+        columnar files next to the database (helper_archive) with the dates, amounts in cents and category
+        ids memory-mapped, plus their sums per day and per month and category in the database.
+        The reads include archived transactions, and the daily totals, balances and rollups keep counting
+        them, so all-time aggregates never read the files. Transactions added later to an archived year
+        stay live until the year is archived again.
+        :param until_year: last year to archive, None for the previous one; the current year is never archived
+        :return: dict, year -> number of transactions moved into the archive
+        """
+        import shutil
+
+        import numpy as np
+
+        import helper_archive
+
+        self._remove_unused_archive_files()
+        last_year = datetime.date.today().year - 1
+        if until_year is not None:
+            last_year = min(int(until_year), last_year)
+        # Years from daily_totals (one row per day), then an existence probe for live transactions in each
+        self.cursor.execute('SELECT DISTINCT substr(date, 1, 4) FROM daily_totals WHERE date < ? ORDER BY 1',
+                            (f'{last_year + 1:04d}-01-01',))
+        years = []
+        for year, in self.cursor.fetchall():
+            self.cursor.execute('SELECT 1 FROM transactions WHERE date >= ? AND date < ? LIMIT 1',
+                                (f'{year}-01-01', f'{int(year) + 1:04d}-01-01'))
+            if self.cursor.fetchone() is not None:
+                years.append(year)
+
+        directory = helper_archive.archive_directory(self.db_path)
+        archived = {}
+        for year in years:
+            year_range = (f'{year}-01-01', f'{int(year) + 1:04d}-01-01')
+            self.cursor.execute('''
+                SELECT id, date, amount, category_id, comment, fingerprint FROM transactions
+                WHERE date >= ? AND date < ?
+                ORDER BY date, id
+            ''', year_range)
+            ids, dates, amounts, category_ids, comments, fingerprints = zip(*self.cursor.fetchall())
+            columns = {
+                'id': np.array(ids, dtype=np.int64),
+                'date': np.array(dates, dtype='datetime64[D]'),
+                'amount': np.array(amounts, dtype=np.int64),
+                'category_id': np.array(category_ids, dtype=np.int64),
+                'comment': list(comments),
+                'fingerprint': list(fingerprints),
+            }
+            # A year archived before gets a new generation of files with the old and the new rows
+            self.cursor.execute('SELECT path FROM archived_years WHERE year = ?', (year,))
+            previous = self.cursor.fetchone()
+            name = f'{year}-1'
+            if previous is not None:
+                previous = previous[0]
+                name = f'{year}-{int(previous.rsplit("-", 1)[1]) + 1}'
+                old = helper_archive.ArchivedYear(os.path.join(directory, previous)).columns()
+                order = np.lexsort((np.concatenate([old['id'], columns['id']]),
+                                    np.concatenate([old['date'], columns['date']])))
+                for column, values in columns.items():
+                    if isinstance(values, list):
+                        merged = old[column] + values
+                        columns[column] = [merged[position] for position in order.tolist()]
+                    else:
+                        columns[column] = np.concatenate([old[column], values])[order]
+            path = helper_archive.write_year(directory, name, columns)
+
+            try:
+                with self.batch():
+                    self.cursor.execute('''
+                        SELECT date, SUM(amount), COUNT(*) FROM transactions
+                        WHERE date >= ? AND date < ?
+                        GROUP BY date
+                    ''', year_range)
+                    days = self.cursor.fetchall()
+                    self.cursor.execute('''
+                        SELECT category_id, SUM(amount), COUNT(*) FROM transactions
+                        WHERE date >= ? AND date < ?
+                        GROUP BY category_id
+                    ''', year_range)
+                    categories = self.cursor.fetchall()
+                    self.cursor.executemany('''
+                        INSERT INTO archived_daily_totals (date, amount, count) VALUES (?, ?, ?)
+                        ON CONFLICT (date) DO UPDATE SET amount = amount + excluded.amount,
+                            count = count + excluded.count
+                    ''', days)
+                    self.cursor.execute('''
+                        INSERT INTO archived_rollups (month, category_id, income, expenses, count)
+                        SELECT substr(date, 1, 7), category_id, SUM(MAX(amount, 0)), SUM(MIN(amount, 0)), COUNT(*)
+                        FROM transactions
+                        WHERE date >= ? AND date < ?
+                        GROUP BY 1, 2
+                        ON CONFLICT (month, category_id) DO UPDATE SET income = income + excluded.income,
+                            expenses = expenses + excluded.expenses, count = count + excluded.count
+                    ''', year_range)
+                    self.cursor.execute('''
+                        INSERT OR IGNORE INTO archived_fingerprints (fingerprint, year)
+                        SELECT fingerprint, ? FROM transactions
+                        WHERE date >= ? AND date < ? AND fingerprint IS NOT NULL
+                    ''', (year, *year_range))
+
+                    # The delete triggers subtract the rows from the aggregates, they are added back
+                    # since the aggregates keep counting archived transactions
+                    self.cursor.execute('DELETE FROM transactions WHERE date >= ? AND date < ?', year_range)
+                    archived[year] = self.cursor.rowcount
+                    self.cursor.executemany('''
+                        INSERT INTO daily_totals (date, amount, count) VALUES (?, ?, ?)
+                        ON CONFLICT (date) DO UPDATE SET amount = amount + excluded.amount,
+                            count = count + excluded.count
+                    ''', days)
+                    self.cursor.executemany('''
+                        INSERT INTO category_balances (category_id, amount, count) VALUES (?, ?, ?)
+                        ON CONFLICT (category_id) DO UPDATE SET amount = amount + excluded.amount,
+                            count = count + excluded.count
+                    ''', categories)
+                    self.cursor.execute('''
+                        UPDATE running_balance SET amount = amount + ?, count = count + ? WHERE id = 1
+                    ''', (sum(amount for _, amount, _ in days), archived[year]))
+                    self.cursor.execute('''
+                        INSERT OR REPLACE INTO archived_years (year, path, count, amount, last_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (year, name, len(columns['id']), int(columns['amount'].sum()), int(columns['id'].max())))
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            # Committed, readers of the database now open the new generation. The previous one stays until
+            # the next run, for readers that looked up the year before the commit
+        return archived
+
+    def restore_year(self, year):
+        """
+        Moves the transactions of an archived year back into the transactions table, with their ids.
+        The year's files are deleted by the next archive() or restore_year(), readers may still use them.
+        :param year: year, e.g. 2019
+        :return: int, number of restored transactions, 0 if the year isn't archived
+        """
+        import numpy as np
+
+        import helper_archive
+
+        self._remove_unused_archive_files()
+        year = f'{int(year):04d}'
+        self.cursor.execute('SELECT path, count, amount FROM archived_years WHERE year = ?', (year,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return 0
+        name, count, amount = row
+        path = os.path.join(helper_archive.archive_directory(self.db_path), name)
+        columns = helper_archive.ArchivedYear(path).columns()
+        rows = list(zip(columns['id'].tolist(), columns['category_id'].tolist(), columns['amount'].tolist(),
+                        np.datetime_as_string(columns['date'], unit='D').tolist(), columns['comment'],
+                        [fingerprint or None for fingerprint in columns['fingerprint']]))
+        year_range = (f'{year}-01-01', f'{int(year) + 1:04d}-01-01')
+
+        with self.batch():
+            # New transactions get ids above the archived ones, but another writer may have given the id of an
+            # archived transaction to a new one; those get a new id, last, so it can't collide with kept ids
+            self.cursor.execute('SELECT id FROM transactions WHERE id IN (SELECT value FROM json_each(?))',
+                                (json.dumps(columns['id'].tolist()),))
+            taken = {trans_id for trans_id, in self.cursor.fetchall()}
+            rows = [row for row in rows if row[0] not in taken] + [(None, *row[1:]) for row in rows if row[0] in taken]
+
+            # The aggregates count the archived transactions, the insert triggers count them again
+            self.cursor.execute('''
+                UPDATE daily_totals SET
+                    amount = amount - (SELECT amount FROM archived_daily_totals a WHERE a.date = daily_totals.date),
+                    count = count - (SELECT count FROM archived_daily_totals a WHERE a.date = daily_totals.date)
+                WHERE date IN (SELECT date FROM archived_daily_totals WHERE date >= ? AND date < ?)
+            ''', year_range)
+            self.cursor.execute('DELETE FROM daily_totals WHERE date >= ? AND date < ? AND count = 0', year_range)
+            self.cursor.execute('''
+                UPDATE category_balances SET
+                    amount = amount - (SELECT SUM(income + expenses) FROM archived_rollups a
+                                       WHERE a.category_id = category_balances.category_id
+                                       AND a.month >= ? AND a.month <= ?),
+                    count = count - (SELECT SUM(count) FROM archived_rollups a
+                                     WHERE a.category_id = category_balances.category_id
+                                     AND a.month >= ? AND a.month <= ?)
+                WHERE category_id IN (SELECT category_id FROM archived_rollups WHERE month >= ? AND month <= ?)
+            ''', (f'{year}-01', f'{year}-12') * 3)
+            self.cursor.execute('DELETE FROM category_balances WHERE count = 0')
+            self.cursor.execute('UPDATE running_balance SET amount = amount - ?, count = count - ? WHERE id = 1',
+                                (amount, count))
+            self.cursor.execute('DELETE FROM archived_daily_totals WHERE date >= ? AND date < ?', year_range)
+            self.cursor.execute('DELETE FROM archived_rollups WHERE month >= ? AND month <= ?',
+                                (f'{year}-01', f'{year}-12'))
+            self.cursor.execute('DELETE FROM archived_fingerprints WHERE year = ?', (year,))
+            self.cursor.execute('DELETE FROM archived_years WHERE year = ?', (year,))
+
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                self.cursor.execute('''
+                    INSERT INTO transactions (id, category_id, amount, date, comment, fingerprint)
+                    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                           json_extract(value, '$[3]'), json_extract(value, '$[4]'), json_extract(value, '$[5]')
+                    FROM json_each(?)
+                ''', (json.dumps(rows[start:start + INSERT_CHUNK_SIZE]),))
+        return len(rows)
+
+    def search(self, text, limit=200, offset=0, filter_by=None):
+        """
+        Finds transactions by words in their comment or category name through the full-text index.
+        The SEARCH_RANK_WINDOW most recently added matches come first, best matches first (bm25), the older
+        ones follow in the order they were added, latest first: ranking costs microseconds per match, so a common
+        word would otherwise rank hundreds of thousands of rows for every page. The order of addition is the id
+        order, not the date order; an old statement imported today counts as recently added. Matching archived
+        transactions follow the live ones, also latest added first.
+        :param text: search text, e.g. 'coffee berl', the last word matches as a prefix
+        :param limit: number of rows per page
+        :param offset: number of matches to skip, the rows of the previous pages
+        :param filter_by: Filter, only matching transactions are searched
+        :return: list of (id, date, category_name, amount as Decimal, comment)
+        """
+        match = _match_expression(text)
+        if not match:
+            return []
+        # A filter joins the transactions, the full-text index still drives the query
+        join = ''
+        restrict = ''
+        params = []
+        if filter_by:
+            conditions, params = filter_by.conditions()
+            join = 'JOIN transactions t ON t.id = f.rowid'
+            restrict = ''.join(f' AND {condition}' for condition in conditions)
+        # Id of the oldest match in the ranked window, None if all matches fit into it
+        self.cursor.execute(f'''
+            SELECT f.rowid FROM transactions_fts f {join} WHERE transactions_fts MATCH ?{restrict}
+            ORDER BY f.rowid DESC LIMIT 1 OFFSET ?
+        ''', (match, *params, SEARCH_RANK_WINDOW - 1))
+        row = self.cursor.fetchone()
+        cutoff = row[0] if row else None
+        ids = []
+        if cutoff is None or offset < SEARCH_RANK_WINDOW:
+            self.cursor.execute(f'''
+                SELECT f.rowid FROM transactions_fts f {join} WHERE transactions_fts MATCH ?{restrict}
+                AND f.rowid >= ?
+                ORDER BY f.rank, f.rowid DESC LIMIT ? OFFSET ?
+            ''', (match, *params, cutoff or 0, limit, offset))
+            ids = [trans_id for trans_id, in self.cursor.fetchall()]
+        if cutoff is not None and len(ids) < limit:
+            self.cursor.execute(f'''
+                SELECT f.rowid FROM transactions_fts f {join} WHERE transactions_fts MATCH ?{restrict}
+                AND f.rowid < ?
+                ORDER BY f.rowid DESC LIMIT ? OFFSET ?
+            ''', (match, *params, cutoff, limit - len(ids), max(offset - SEARCH_RANK_WINDOW, 0)))
+            ids += [trans_id for trans_id, in self.cursor.fetchall()]
+        self.cursor.execute('''
+            SELECT t.id, t.date, c.name, t.amount, t.comment
+            FROM transactions t
+            JOIN categories c ON c.id = t.category_id
+            WHERE t.id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(ids),))
+        rows = {trans_id: (trans_id, date, category_name, from_cents(amount), comment)
+                for trans_id, date, category_name, amount, comment in self.cursor.fetchall()}
+        rows = [rows[trans_id] for trans_id in ids]
+        if len(rows) == limit:
+            return rows
+
+        archive, names = self._archive()
+        if archive is None:
+            return rows
+        # The live matches are used up, the archived ones continue after all of them
+        self.cursor.execute(f'SELECT COUNT(*) FROM transactions_fts f {join} WHERE transactions_fts MATCH ?{restrict}',
+                            (match, *params))
+        skip = max(offset - self.cursor.fetchone()[0], 0)
+        self.cursor.execute('SELECT id, name FROM categories')
+        category_names = dict(self.cursor.fetchall())
+        return rows + [(trans_id, date, category_name, from_cents(amount), comment)
+                       for trans_id, date, category_name, amount, comment
+                       in archive.search(names, text, limit - len(rows), skip, filter_by, category_names)]
+
+    def _missing_rollup_months(self, first_day=None, last_day=None):
+        """
+        Months with transactions between the days whose rollups are not cached, found in daily_totals
+        (one row per day) instead of the transactions.
+        :return: list of 'YYYY-MM'
+        """
+        conditions = []
+        params = []
+        if first_day is not None:
+            conditions.append('date >= ?')
+            params.append(first_day)
+        if last_day is not None:
+            conditions.append('date <= ?')
+            params.append(last_day)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        self.cursor.execute(f'''
+            SELECT DISTINCT substr(date, 1, 7) AS month FROM daily_totals {where}
+            EXCEPT SELECT month FROM rollup_months
+            ORDER BY month
+        ''', params)
+        return [month for month, in self.cursor.fetchall()]
+
+    def _month_rollups(self, months):
+        """
+        Subquery with the rows (month, category_id, income, expenses, count) of the given months, aggregated
+        from the transactions and the rollups of the archived transactions.
+        :param months: list of 'YYYY-MM'
+        :return: tuple (SQL, parameters)
+        """
+        condition, params = _month_ranges(months)
+        query = f'''
+            SELECT month, category_id, SUM(income) AS income, SUM(expenses) AS expenses, SUM(count) AS count
+            FROM (
+                SELECT substr(date, 1, 7) AS month, category_id, SUM(MAX(amount, 0)) AS income,
+                       SUM(MIN(amount, 0)) AS expenses, COUNT(*) AS count
+                FROM transactions
+                WHERE {condition}
+                GROUP BY 1, 2
+                UNION ALL
+                SELECT month, category_id, income, expenses, count FROM archived_rollups
+                WHERE month IN (SELECT value FROM json_each(?))
+            )
+            GROUP BY month, category_id
+        '''
+        return query, params + [json.dumps(months)]
+
+    def pending_rollups(self):
+        """
+        Computes the rollups of all closed months that are not cached yet without storing them, so a read-only
+        Tracker can do the aggregation on another thread. The current month stays uncached, it still changes.
+        :return: tuple (list of 'YYYY-MM', list of (month, category_id, income, expenses, count))
+        """
+        current = datetime.date.today().strftime('%Y-%m')
+        months = [month for month in self._missing_rollup_months() if month < current]
+        if not months:
+            return [], []
+        rollups, params = self._month_rollups(months)
+        self.cursor.execute(rollups, params)
+        return months, self.cursor.fetchall()
+
+    def update_rollups(self):
+        """
+        Caches the rollups of all closed months that are not cached yet.
+        :return: int, number of months stored
+        """
+        return self.store_rollups(*self.pending_rollups())
+
+    def store_rollups(self, months, rollups):
+        """
+        Caches rollups computed by pending_rollups(). They are only valid for the data they were computed from,
+        the caller makes sure nothing was written since. Only caches, so it doesn't count as a change of the data
+        for data_version().
+        :param months: list of 'YYYY-MM', the months the rollups cover
+        :param rollups: list of (month, category_id, income, expenses, count)
+        :return: int, number of months stored
+        """
+        if not months:
+            return 0
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO monthly_rollups (month, category_id, income, expenses, count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rollups)
+        self.cursor.executemany('INSERT OR IGNORE INTO rollup_months (month) VALUES (?)', [(m,) for m in months])
+        if not self._batch_depth:
+            self.connection.commit()
+        return len(months)
+
+    def clear_rollups(self):
+        """
+        Empties the rollup cache, the next report computes and caches the closed months again.
+        """
+        with self.batch():
+            self.cursor.execute('DELETE FROM monthly_rollups')
+            self.cursor.execute('DELETE FROM rollup_months')
+
+    def _rollups(self, first_day, last_day):
+        """
+        Subquery with the rows (month, category_id, income, expenses) between the days: the cached months
+        from monthly_rollups, the others (the current month, or any month on a read-only Tracker)
+        aggregated from the transactions and the archived rollups. A writable Tracker caches the closed months first.
+        :return: tuple (SQL, parameters)
+        """
+        if not self.read_only:
+            self.update_rollups()
+        parts = ['SELECT month, category_id, income, expenses FROM monthly_rollups WHERE month >= ? AND month <= ?']
+        params = [first_day[:7] if first_day else '', last_day[:7] if last_day else '9999']
+        missing = self._missing_rollup_months(first_day, last_day)
+        if missing:
+            rollups, month_params = self._month_rollups(missing)
+            parts.append(f'SELECT month, category_id, income, expenses FROM ({rollups})')
+            params += month_params
+        return ' UNION ALL '.join(parts), params
+
+    def report(self, period='month', start=None, end=None, as_array=False):
+        """
+        Income, expenses and net per month or year, and the balance at the end of every period.
+        Closed months are read from the rollup cache, so a report costs about one read per period.
+        :param period: 'month' or 'year'
+        :param start: first period, 'YYYY-MM' for months or 'YYYY' for years, None for the beginning
+        :param end: last period, None for the latest
+        :param as_array: return a NumPy structured array instead of a DataFrame
+        :return: DataFrame with the columns period, income, expenses (positive), net and balance
+        """
+        first_day, last_day = _period_days(period, start, end)
+        rollups, params = self._rollups(first_day, last_day)
+        key = 'month' if period == 'month' else 'substr(month, 1, 4)'
+        opening = self._balance_before_cents(first_day) if first_day else 0
+        query = f'''
+            SELECT period, income, expenses, income - expenses AS net,
+                   ? + SUM(income - expenses) OVER (ORDER BY period) AS balance
+            FROM (
+                SELECT {key} AS period, SUM(income) AS income, -SUM(expenses) AS expenses
+                FROM ({rollups})
+                GROUP BY period
+            )
+            ORDER BY period
+        '''
+        return self._read(query, REPORT_COLUMNS, (opening, *params), as_array)
+
+    def category_report(self, period='month', start=None, end=None, as_array=False):
+        """
+        Income, expenses and net per category for every month or year, with each category's share
+        of the period's expenses.
+        :param period: 'month' or 'year'
+        :param start: first period, 'YYYY-MM' for months or 'YYYY' for years, None for the beginning
+        :param end: last period, None for the latest
+        :param as_array: return a NumPy structured array instead of a DataFrame
+        :return: DataFrame with the columns period, category_name, income, expenses, net and share (percent)
+        """
+        first_day, last_day = _period_days(period, start, end)
+        rollups, params = self._rollups(first_day, last_day)
+        key = 'month' if period == 'month' else 'substr(month, 1, 4)'
+        query = f'''
+            SELECT period, category_id, income, expenses, income - expenses AS net,
+                   100.0 * expenses / NULLIF(SUM(expenses) OVER (PARTITION BY period), 0) AS share
+            FROM (
+                SELECT {key} AS period, category_id, SUM(income) AS income, -SUM(expenses) AS expenses
+                FROM ({rollups})
+                GROUP BY period, category_id
+            )
+            ORDER BY period, expenses DESC
+        '''
+        return self._read(query, CATEGORY_REPORT_COLUMNS, params, as_array)
+
+    def enable_stats(self, stats=None, slow_ms=None):
+        """
+        Starts recording the latency and calls of every public method and the latency, rows and SQLite VM steps
+        of every statement. Nothing is wrapped or hooked while disabled, so it costs nothing then.
+        The VM steps come from SQLite's progress handler and include the work of the triggers. (A trace callback
+        is not used: sqlite3 expands the parameters into the SQL text for every trigger statement, which made
+        bulk deletes with a long id list many times slower.)
+        :param stats: helper_stats.Stats to record into, e.g. one shared with the worker threads' Trackers;
+            None for a new one
+        :param slow_ms: log statements slower than this with their query plan, only for a new Stats
+        :return: Stats
+        """
+        import helper_stats
+
+        self.disable_stats()
+        stats = self.stats = stats or helper_stats.Stats(slow_ms)
+        steps = [0]
+
+        def progress():
+            steps[0] += 1
+
+        self.connection.set_progress_handler(progress, helper_stats.PROGRESS_STEPS)
+        self.cursor = helper_stats.InstrumentedCursor(self.cursor, stats, steps)
+        # Instance attributes shadow the methods until disable_stats() deletes them again
+        for name in dir(type(self)):
+            if name.startswith('_') or name in ('batch', 'enable_stats', 'disable_stats', 'stats_snapshot'):
+                continue
+            method = getattr(self, name)
+            if callable(method):
+                setattr(self, name, helper_stats.timed_method(stats, name, method, self.cursor.flush))
+                self._timed_methods.append(name)
+        return stats
+
+    def disable_stats(self):
+        """
+        Stops recording, the Stats keep what they recorded so far.
+        """
+        if self.stats is None:
+            return
+        self.cursor.flush()
+        self.cursor = self.cursor.unwrap()
+        self.connection.set_progress_handler(None, 0)
+        for name in self._timed_methods:
+            delattr(self, name)
+        self._timed_methods = []
+        self.stats = None
+
+    def stats_snapshot(self):
+        """
+        The recorded numbers, see helper_stats.Stats.snapshot().
+        :return: dict, None while instrumentation is disabled
+        """
+        if self.stats is None:
+            return None
+        self.cursor.flush()
+        return self.stats.snapshot()
 
     def close_db(self):
+        self.disable_stats()
         self.connection.close()
 
 
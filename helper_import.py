@@ -0,0 +1,144 @@
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+import hashlib
+import itertools
+import time
+
+# CSV header for each transaction field; pass a dict with the same keys to import other layouts
+DEFAULT_COLUMNS = {
+    "category": "category",
+    "amount": "amount",
+    "date": "date",
+    "comment": "comment",
+}
+
+
+def parse_amount(text, decimal="."):
+    """
+    Parses an amount like '-1234.56', or '-1.234,56' with decimal=','.
+    :return: Decimal
+    """
+    text = str(text).strip().replace(" ", "")
+    if decimal == ",":
+        text = text.replace(".", "").replace(",", ".")
+    else:
+        text = text.replace(",", "")
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount: {text!r}") from None
+
+
+def fingerprint(category, amount, date, comment, occurrence=0):
+    """
+    Stable hash of a statement row. `occurrence` numbers identical rows of the same day, so two equal
+    coffees on one day stay two transactions, while importing the same statement again matches both.
+    :return: str
+    """
+    key = f"{date}|{category}|{amount:.2f}|{comment}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _read_rows(path, columns=None, delimiter=",", decimal=".", encoding="utf-8-sig"):
+    """
+    Streams the rows of a CSV statement with their line numbers, see read_statement.
+    :return: generator of (line, transaction tuple or None, error message or None)
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    with open(path, newline="", encoding=encoding) as file:
+        reader = csv.DictReader(file, delimiter=delimiter)
+        current_date = None
+        # Days the statement has moved past, one entry per day
+        finished = set()
+        seen = {}
+        for row in reader:
+            category = (row.get(columns["category"]) or "").strip()
+            comment = (row.get(columns["comment"]) or "").strip()
+            amount = row.get(columns["amount"])
+            date = (row.get(columns["date"]) or "").strip()
+            try:
+                amount = parse_amount(amount, decimal)
+                date = datetime.date.fromisoformat(date).isoformat()
+            except (TypeError, ValueError):
+                yield reader.line_num, (category, amount, date, comment, None), None
+                continue
+
+            if date != current_date:
+                if date in finished:
+                    # The rows of this day were numbered already, numbering again would turn a second
+                    # identical row into a duplicate of the first
+                    yield reader.line_num, None, f"date {date} comes back after {current_date}, " \
+                                                 f"the statement must be sorted by date"
+                    continue
+                if current_date is not None:
+                    finished.add(current_date)
+                current_date = date
+                seen.clear()
+            key = (category, amount, comment)
+            occurrence = seen.get(key, 0)
+            seen[key] = occurrence + 1
+            yield reader.line_num, (category, amount, date, comment,
+                                    fingerprint(category, amount, date, comment, occurrence)), None
+
+
+def read_statement(path, columns=None, delimiter=",", decimal=".", encoding="utf-8-sig"):
+    """
+    Streams the rows of a CSV statement as transaction tuples for Tracker.add_transactions.
+    Only the current day's rows are kept in memory (for numbering identical rows), so statements
+    are expected in date order, which is how banks export them.
+    Rows whose amount or date can't be parsed are passed on unchanged, Tracker reports them.
+    :param path: CSV file with a header line
+    :param columns: dict mapping 'category', 'amount', 'date' and 'comment' to CSV headers
+    :return: generator of (category, amount, date, comment, fingerprint)
+    :raises ValueError: when a date comes back after the statement moved past it
+    """
+    for line, transaction, error in _read_rows(path, columns, delimiter, decimal, encoding):
+        if error is not None:
+            raise ValueError(f"{path}:{line}: {error}")
+        yield transaction
+
+
+def import_csv(tracker, path, columns=None, chunk_size=5000, delimiter=",", decimal=".", encoding="utf-8-sig"):
+    """
+    Imports a CSV statement chunk by chunk, each chunk with one bulk insert and one commit.
+    Rows that were imported before (same fingerprint) are skipped, so overlapping statements can be
+    imported again safely. Rows of a day that comes back after the statement moved past it are reported
+    as errors, they can't be told apart from rows imported before.
+    :param tracker: Tracker to write to
+    :param path: CSV file with a header line
+    :param columns: dict mapping 'category', 'amount', 'date' and 'comment' to CSV headers
+    :param chunk_size: rows per insert, bounds the memory use
+    :return: dict with rows, inserted, duplicates, errors (list of (line, message)), seconds, rows_per_sec
+    """
+    start = time.perf_counter()
+    rows = _read_rows(path, columns, delimiter, decimal, encoding)
+    total = inserted = 0
+    errors = []
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        lines = []
+        transactions = []
+        for line, transaction, error in chunk:
+            if error is not None:
+                errors.append((line, error))
+            else:
+                lines.append(line)
+                transactions.append(transaction)
+        chunk_inserted, chunk_errors = tracker.add_transactions(transactions)
+        # Line numbers in the file: the header is line 1
+        errors.extend((lines[index], message) for index, message in chunk_errors)
+        inserted += chunk_inserted
+        total += len(chunk)
+    errors.sort()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "duplicates": total - inserted - len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_sec": total / seconds if seconds else 0.0,
+    }
@@ -1,46 +1,164 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+# The balance graph shows markers up to this number of points
+MARKER_LIMIT = 90
 
-def bar_plot(canvas_frame, df):
+
+def lttb(x, y, threshold):
     """
-    Embed a bar plot in the given tkinter frame.
+    Largest-Triangle-Three-Buckets downsampling: picks `threshold` points that keep the visual shape
+    of the series (peaks and dips survive, unlike with plain averaging or striding).
+    :param x: ascending numeric NumPy array
+    :param y: NumPy array of the same length
+    :param threshold: number of points to keep
+    :return: NumPy array with the indices of the kept points
     """
-    df = df.groupby(by='category_name', as_index=False).sum()
-    df = df.sort_values(by='amount', ascending=True)
-    fig, ax = plt.subplots(figsize=(6, 4))  # Create the figure and axes
-    ax.barh(y=df['category_name'], width=df['amount'], color='skyblue', edgecolor='black')
-    ax.set_xlabel('Total Amount')
-    ax.set_title('Total Spending by Category')
-    ax.set_xlim(0)
-    plt.tight_layout()
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
 
-    canvas = FigureCanvasTkAgg(fig, master=canvas_frame)
-    canvas.draw()
-    canvas.get_tk_widget().pack()
+    # First and last point are always kept, the rest is split into threshold - 2 buckets
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        # Third corner of the triangle: the average of the next bucket
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(areas.argmax())
+        indices[bucket + 1] = previous
+    indices[-1] = n - 1
+    return indices
 
 
-def graph(canvas_frame, df_trans):
+def prepare_graph_data(df_trans, max_points=2000):
     """
-    Embed a line graph in the given tkinter frame.
+    Converts the dates of the daily balance for BalanceGraph and downsamples long histories to at most
+    max_points, so the drawing time doesn't grow with the history. Doesn't touch Tk, so it can run
+    on a worker thread.
     """
-    # Change str-date into datetime-date
-    df_trans['date'] = pd.to_datetime(df_trans['date'])
+    # Tracker returns datetime64 dates already, only str-dates from other sources need parsing
+    if not pd.api.types.is_datetime64_any_dtype(df_trans['date']):
+        df_trans['date'] = pd.to_datetime(df_trans['date'])
+    if len(df_trans) > max_points:
+        x = df_trans['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+        y = df_trans['balance'].to_numpy(dtype=np.float64)
+        df_trans = df_trans.iloc[lttb(x, y, max_points)].reset_index(drop=True)
+    return df_trans
 
-    fig, ax = plt.subplots(figsize=(6, 4), dpi=100)
-    ax.plot(df_trans["date"], df_trans["balance"], marker='o', color='orange', label='Line Graph')
-    ax.set_title("Balance Over Time")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Balance")
-    ax.tick_params(axis='x', rotation=45)
-    ax.autoscale(axis='x', tight=True)
-    # Format the x-axis to display the dates better
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax.xaxis.set_major_locator(mdates.DayLocator(interval=5))
-    ax.grid(alpha=0.5)
 
-    canvas = FigureCanvasTkAgg(fig, master=canvas_frame)
-    canvas.draw()
+def _make_canvas(figure, canvas_frame):
+    """
+    Embeds the figure in the given tkinter frame, or renders it off-screen if there is no frame.
+    Figures are created without pyplot, so they are freed with their plot object instead of piling up
+    in pyplot's figure registry.
+    """
+    if canvas_frame is None:
+        return FigureCanvasAgg(figure)
+    canvas = FigureCanvasTkAgg(figure, master=canvas_frame)
     canvas.get_tk_widget().pack()
+    return canvas
+
+
+class ExpensesPlot:
+    """
+    Bar plot of the spending per category. Created once per tab, update() changes the bars in place.
+    """
+
+    def __init__(self, canvas_frame):
+        self.figure = Figure(figsize=(6, 4))
+        self.ax = self.figure.add_subplot()
+        self.ax.set_xlabel('Total Amount')
+        self.ax.set_title('Total Spending by Category')
+        self.bars = None
+        self.categories = None
+        self.canvas = _make_canvas(self.figure, canvas_frame)
+
+    def update(self, df):
+        """
+        Shows the per-category totals from Tracker.expenses_by_category, sorted ascending.
+        """
+        categories = list(df['category_name'])
+        if categories == self.categories:
+            # Same categories in the same order: only the bar lengths change
+            for bar, amount in zip(self.bars, df['amount']):
+                bar.set_width(amount)
+        else:
+            # Numeric positions with tick labels, a categorical axis would keep the removed categories
+            if self.bars is not None:
+                self.bars.remove()
+            positions = range(len(categories))
+            self.bars = self.ax.barh(y=positions, width=df['amount'], color='skyblue', edgecolor='black')
+            self.ax.set_yticks(positions, labels=categories)
+            self.categories = categories
+            # New tick labels may need a different margin
+            self.figure.tight_layout()
+        self.ax.relim()
+        self.ax.autoscale_view()
+        # Keep autoscaling on for the next update
+        self.ax.set_xlim(0, auto=None)
+        self.canvas.draw_idle()
+
+
+class BalanceGraph:
+    """
+    Line graph of the balance over time. Created once per tab, update() replaces the line data.
+    The line is drawn with blitting: when the axis limits don't change, only the line is redrawn
+    on top of the cached background.
+    """
+
+    def __init__(self, canvas_frame):
+        self.figure = Figure(figsize=(6, 4), dpi=100)
+        self.ax = self.figure.add_subplot()
+        self.ax.xaxis_date()
+        self.line, = self.ax.plot([], [], color='orange', label='Line Graph', animated=True)
+        self.ax.set_title("Balance Over Time")
+        self.ax.set_xlabel("Date")
+        self.ax.set_ylabel("Balance")
+        # Ticks adapt to the range, from days for a month up to years for the whole history
+        locator = mdates.AutoDateLocator(minticks=4, maxticks=8)
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.ax.grid(alpha=0.5)
+        self.figure.tight_layout()
+
+        self.background = None
+        self.canvas = _make_canvas(self.figure, canvas_frame)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # A full draw leaves out the animated line: keep the background and draw the line on top
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.figure.bbox)
+
+    def update(self, df_trans):
+        """
+        Shows the data from prepare_graph_data.
+        """
+        limits = self.ax.get_xlim(), self.ax.get_ylim()
+        self.line.set_data(df_trans["date"], df_trans["balance"])
+        # Markers only help while the single days can be told apart
+        self.line.set_marker('o' if len(df_trans) <= MARKER_LIMIT else '')
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.autoscale(axis='x', tight=True)
+
+        if self.background is not None and limits == (self.ax.get_xlim(), self.ax.get_ylim()):
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.line)
+            self.canvas.blit(self.figure.bbox)
+        else:
+            # New limits may come with wider tick labels
+            self.figure.tight_layout()
+            self.canvas.draw_idle()
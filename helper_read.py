@@ -0,0 +1,144 @@
+import numpy as np
+
+# How a result column is converted:
+#   'int'      integer column (ids)
+#   'cents'    amount in integer cents, returned as float euros
+#   'float'    real number, NULL becomes NaN
+#   'date'     ISO date string, returned as datetime64
+#   'category' category id, returned as the category name (categorical in a DataFrame); selecting the id
+#              instead of joining the name skips the join and encodes the column with integer operations
+#   'text'     free text (comments), kept as Python strings
+COLUMN_KINDS = ('int', 'cents', 'float', 'date', 'category', 'text')
+
+# Rows fetched from SQLite at a time, only one chunk of Python tuples is alive at once
+CHUNK_SIZE = 50_000
+
+
+def _parse_dates(values):
+    """
+    Converts ISO date strings to datetime64[D]; strings that aren't dates become NaT.
+    """
+    try:
+        return np.array(values, dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        dates = np.empty(len(values), dtype='datetime64[D]')
+        for i, value in enumerate(values):
+            try:
+                dates[i] = np.datetime64(value, 'D')
+            except (TypeError, ValueError):
+                dates[i] = np.datetime64('NaT')
+        return dates
+
+
+def category_codes(ids, category_ids):
+    """
+    Encodes category ids as positions in the sorted ids of all categories, -1 for an unknown id.
+    :param ids: NumPy array of category ids
+    :param category_ids: NumPy array of all category ids, sorted ascending
+    :return: int32 NumPy array
+    """
+    codes = np.searchsorted(category_ids, ids).astype(np.int32)
+    found = codes < len(category_ids)
+    found[found] = category_ids[codes[found]] == ids[found]
+    codes[~found] = -1
+    return codes
+
+
+def fetch_columns(cursor, kinds, category_names=None, chunk_size=CHUNK_SIZE):
+    """
+    Streams the result of an executed query into one typed NumPy array per column.
+    :param cursor: cursor with an executed query, selecting the columns in the order of kinds
+    :param kinds: list of (column name, kind), kind is one of COLUMN_KINDS
+    :param category_names: dict, category id -> name, needed for 'category' columns
+    :param chunk_size: number of rows fetched per fetchmany() call
+    :return: dict, column name -> NumPy array (codes for 'category' columns),
+             and dict, column name -> list of category names the codes point into
+    """
+    chunks = {name: [] for name, _ in kinds}
+    # Codes of a category column are positions in the ids sorted ascending, -1 for an unknown id
+    category_ids = np.array(sorted(category_names or ()), dtype=np.int64)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for (name, kind), values in zip(kinds, zip(*rows)):
+            if kind == 'int':
+                array = np.fromiter(values, dtype=np.int64, count=len(values))
+            elif kind == 'cents':
+                array = np.fromiter(values, dtype=np.int64, count=len(values)) / 100
+            elif kind == 'float':
+                array = np.array(values, dtype=np.float64)
+            elif kind == 'date':
+                array = _parse_dates(values)
+            elif kind == 'category':
+                array = category_codes(np.fromiter(values, dtype=np.int64, count=len(values)), category_ids)
+            else:
+                array = np.array(values, dtype=object)
+            chunks[name].append(array)
+
+    empty = {'int': np.int64, 'cents': np.float64, 'float': np.float64, 'date': 'datetime64[D]', 'category': np.int32,
+             'text': object}
+    columns = {name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=empty[kind])
+               for name, kind in kinds}
+    labels = [category_names[category_id] for category_id in category_ids.tolist()]
+    categories = {name: labels for name, kind in kinds if kind == 'category'}
+    return columns, categories
+
+
+def to_frame(columns, categories):
+    """
+    Builds a DataFrame from fetch_columns() without copying through Python objects again.
+    :return: DataFrame
+    """
+    import pandas as pd
+
+    data = {}
+    for name, array in columns.items():
+        if name in categories:
+            data[name] = pd.Categorical.from_codes(array, categories=categories[name])
+        elif array.dtype.kind == 'M':
+            data[name] = array.astype('datetime64[ns]')
+        else:
+            data[name] = array
+    return pd.DataFrame(data)
+
+
+def to_records(columns, categories):
+    """
+    Builds a NumPy structured array from fetch_columns(), for callers that don't need pandas.
+    Category names become fixed-width strings, free text stays as Python objects.
+    :return: NumPy structured array
+    """
+    fields = []
+    for name, array in columns.items():
+        if name in categories:
+            width = max((len(category) for category in categories[name]), default=1)
+            fields.append((name, f'U{width}'))
+        else:
+            fields.append((name, array.dtype))
+    length = len(next(iter(columns.values()))) if columns else 0
+    records = np.empty(length, dtype=fields)
+    for name, array in columns.items():
+        if name in categories:
+            # The extra empty name at the end is what code -1 (unknown category) picks
+            names = np.array(categories[name] + [''], dtype=records.dtype[name])
+            records[name] = names[array]
+        else:
+            records[name] = array
+    return records
+
+
+def read(cursor, kinds, category_names=None, as_array=False, chunk_size=CHUNK_SIZE):
+    """
+    Shared read layer of the Tracker: typed columns from an executed query.
+    :param cursor: cursor with an executed query
+    :param kinds: list of (column name, kind), in the order of the selected columns
+    :param category_names: dict, category id -> name, needed for 'category' columns
+    :param as_array: return a NumPy structured array instead of a DataFrame
+    :param chunk_size: number of rows fetched per fetchmany() call
+    :return: DataFrame or NumPy structured array
+    """
+    columns, categories = fetch_columns(cursor, kinds, category_names, chunk_size)
+    if as_array:
+        return to_records(columns, categories)
+    return to_frame(columns, categories)
@@ -0,0 +1,167 @@
+import collections
+import functools
+import logging
+import threading
+import time
+
+# SQLite calls the progress handler every this many virtual machine instructions
+PROGRESS_STEPS = 1000
+# Number of slow statements kept with their query plan
+SLOW_LOG_SIZE = 100
+
+slow_query_logger = logging.getLogger('finance_tracker.slow_queries')
+
+
+class Stats:
+    """
+    Latency, row and call counts of Tracker methods and SQL statements. One Stats can be shared by
+    several Trackers (e.g. the GUI's and the worker threads' read connections), updates are locked.
+    Statements that take at least slow_ms are logged with their EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, slow_ms=None):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name -> [calls, total seconds, max seconds]
+            self.methods = collections.defaultdict(lambda: [0, 0.0, 0.0])
+            # SQL text -> [calls, total seconds, max seconds, rows, VM steps]
+            self.statements = collections.defaultdict(lambda: [0, 0.0, 0.0, 0, 0])
+            self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+    def record_method(self, name, seconds):
+        with self._lock:
+            entry = self.methods[name]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def record_statement(self, sql, seconds, rows, steps):
+        with self._lock:
+            entry = self.statements[sql]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows
+            entry[4] += steps
+
+    def record_slow(self, sql, params, seconds, plan):
+        with self._lock:
+            self.slow.append((time.time(), sql, params, seconds, plan))
+        slow_query_logger.warning('slow query (%.1f ms): %s %r\n%s', seconds * 1000, ' '.join(sql.split()), params,
+                                  '\n'.join(plan))
+
+    def snapshot(self):
+        """
+        Copy of the numbers, sorted by total time.
+        :return: dict with 'methods': list of (name, calls, total ms, max ms),
+            'statements': list of (sql, calls, total ms, max ms, rows, VM steps) and
+            'slow': list of (unix time, sql, params, ms, list of query plan lines)
+        """
+        with self._lock:
+            methods = [(name, calls, total * 1000, longest * 1000)
+                       for name, (calls, total, longest) in self.methods.items()]
+            statements = [(sql, calls, total * 1000, longest * 1000, rows, steps)
+                          for sql, (calls, total, longest, rows, steps) in self.statements.items()]
+            slow = [(when, sql, params, seconds * 1000, plan) for when, sql, params, seconds, plan in self.slow]
+        return {
+            'methods': sorted(methods, key=lambda method: method[2], reverse=True),
+            'statements': sorted(statements, key=lambda statement: statement[2], reverse=True),
+            'slow': slow,
+        }
+
+
+class InstrumentedCursor:
+    """
+    Wraps a sqlite3 cursor and records every statement: the time of execute() plus the fetches of its rows,
+    the number of rows fetched (or changed) and the VM steps counted by the progress handler.
+    A statement is recorded when the next one starts or when flush() is called.
+    """
+
+    def __init__(self, cursor, stats, steps):
+        self._cursor = cursor
+        self._stats = stats
+        # One-element list shared with the progress handler of the connection
+        self._steps = steps
+        self._current = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def unwrap(self):
+        return self._cursor
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def flush(self):
+        current, self._current = self._current, None
+        if current is None:
+            return
+        sql, params, seconds, rows, steps_before = current
+        if rows is None:
+            rows = max(self._cursor.rowcount, 0)
+        self._stats.record_statement(sql, seconds, rows, (self._steps[0] - steps_before) * PROGRESS_STEPS)
+        if self._stats.slow_ms is not None and seconds * 1000 >= self._stats.slow_ms:
+            self._stats.record_slow(sql, params, seconds, self._query_plan(sql, params))
+
+    def _query_plan(self, sql, params):
+        try:
+            plan = self._cursor.connection.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        except Exception as error:
+            return [f'no query plan: {error}']
+        return [detail for *_, detail in plan]
+
+    def _start(self, method, sql, params, plan_params):
+        self.flush()
+        steps_before = self._steps[0]
+        start = time.perf_counter()
+        method(sql, params)
+        self._current = [sql, plan_params, time.perf_counter() - start, None, steps_before]
+        return self
+
+    def execute(self, sql, params=()):
+        return self._start(self._cursor.execute, sql, params, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        return self._start(self._cursor.executemany, sql, seq_of_params, seq_of_params[0] if seq_of_params else ())
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        if self._current is not None:
+            self._current[2] += time.perf_counter() - start
+            if isinstance(rows, list):
+                self._current[3] = (self._current[3] or 0) + len(rows)
+            elif rows is not None:
+                self._current[3] = (self._current[3] or 0) + 1
+        return rows
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(self._cursor.fetchmany, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+
+def timed_method(stats, name, method, on_return):
+    """
+    Wraps a bound method so that every call records its latency in stats.
+    :param on_return: called after every call, before the latency is recorded
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            on_return()
+            stats.record_method(name, time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,88 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+
+class Worker:
+    """
+    Runs Tracker reads and plot preparation on a thread pool, so the Tk main loop never waits for SQLite,
+    pandas or matplotlib. Every job borrows a read-only Tracker from the ConnectionManager. Results are handed back
+    to the Tk thread by polling a queue with root.after, because Tk must only be used from its own thread.
+    """
+
+    def __init__(self, root, manager, max_workers=2, poll_ms=25):
+        self.root = root
+        self.manager = manager
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tracker-worker")
+        self._results = queue.Queue()
+        # Request key -> number of the newest request, older results of the same key are stale
+        self._generations = {}
+        self._futures = {}
+        self._after_id = None
+        # helper_stats.Stats the readers record into, None while instrumentation is off
+        self.stats = None
+
+    def _run(self, key, generation, job, callback, on_error):
+        try:
+            with self.manager.reader() as reader:
+                # Follow the instrumentation setting of the GUI
+                if reader.stats is not self.stats:
+                    if self.stats is None:
+                        reader.disable_stats()
+                    else:
+                        reader.enable_stats(self.stats)
+                result = job(reader)
+        except Exception as error:
+            self._results.put((key, generation, on_error, error))
+        else:
+            self._results.put((key, generation, callback, result))
+
+    def submit(self, key, job, callback, on_error=None):
+        """
+        Runs job(tracker) on a worker thread and callback(result) on the Tk thread afterwards.
+        A newer request with the same key makes this one stale: it is cancelled if it has not started yet,
+        otherwise its result is dropped.
+        :param key: name of the request slot, e.g. "tab"
+        :param job: function taking a read-only Tracker, must not touch any Tk widget
+        :param callback: function taking the result of job, runs on the Tk thread
+        :param on_error: function taking the exception if job fails, shows an error dialog by default
+        """
+        self.cancel(key)
+        generation = self._generations[key]
+        on_error = on_error or (lambda error: messagebox.showerror("Error", str(error)))
+        self._futures[key] = self._executor.submit(self._run, key, generation, job, callback, on_error)
+        if self._after_id is None:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def cancel(self, key):
+        """
+        Makes the pending request with this key stale.
+        """
+        self._generations[key] = self._generations.get(key, 0) + 1
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def _poll(self):
+        self._after_id = None
+        while True:
+            try:
+                key, generation, deliver, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self._generations.get(key):
+                self._futures.pop(key, None)
+                deliver(value)
+        # Keep polling only while requests are outstanding
+        if self._futures:
+            self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def shutdown(self):
+        """
+        Cancels all pending requests and waits for the running ones. The ConnectionManager closes the connections.
+        """
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
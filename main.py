@@ -1,11 +1,17 @@
-from helper_database import Tracker
-from helper_plot import bar_plot, graph
+from helper_connections import ConnectionManager
+from helper_database import Filter
+from helper_import import import_csv
+from helper_worker import Worker
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from tkcalendar import Calendar
+from tkinter import filedialog
+import argparse
 import datetime
 
+# helper_plot (matplotlib, pandas) and tkcalendar are imported when a tab or dialog first needs them,
+# so the window appears without waiting for them
+
 COLORS = {
     "background": "#f0f0f0",  # Light Gray
     "button_background": "#d9d9d9",  # Slightly Darker Gray
@@ -16,6 +22,23 @@ COLORS = {
     "text": "#000000"  # Dark purple text for a rich contrast
 }
 
+# Number of rows the Table tab fetches at once
+TABLE_PAGE_SIZE = 200
+# Number of pages the Table tab keeps, scrolling further drops the page at the other end
+TABLE_PAGES = 5
+# Ranges of the Graph tab: days back from today, None for the whole history
+GRAPH_RANGES = {"30 days": 30, "1 year": 365, "All time": None}
+# Table column -> sort order of Tracker.fetch_transactions_page
+TABLE_SORT_ORDERS = {"Date": "date", "Category": "category", "Amount": "amount"}
+# Milliseconds the Table tab waits after the last keystroke in the search box before it searches
+SEARCH_DELAY_MS = 250
+# Choices of the filter bar's type selector -> sign of the Filter
+FILTER_SIGNS = {"All": None, "Income": "income", "Expenses": "expense"}
+# Tabs that show only the transactions matching the filter bar: Graph, Expenses, Table
+FILTERED_TABS = (1, 2, 3)
+# Periods of the Reports tab -> period of Tracker.report
+REPORT_PERIODS = {"Monthly": "month", "Yearly": "year"}
+
 FONTS = {
     "heading": ("Arial", 20, "bold"),
     "subheading": ("Arial", 14, "bold"),
@@ -24,15 +47,21 @@ FONTS = {
 }
 
 
-def main():
-    tracker = Tracker()
-    gui(tracker)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Finance Tracker")
+    parser.add_argument("--db", default="example.db", help="SQLite database file (default: example.db)")
+    args = parser.parse_args(argv)
+    gui(ConnectionManager(args.db))
 
 
-def gui(tracker):
+def gui(manager):
+    # The GUI writes through the manager's writer, the tabs read through its pool of read-only connections
+    tracker = manager.writer()
     root = tk.Tk()
     root.title("Finance Tracker")
     root.config(bg=COLORS["background"])
+    # Reads for the tabs run in the background, with their own connections to the database
+    worker = Worker(root, manager)
 
     '''
         Applying ttk.Style for the whole GUI. 
@@ -142,7 +171,7 @@ def gui(tracker):
         Creating a Notebook (container for tabs)
     '''
     notebook = ttk.Notebook(root)
-    notebook.grid(row=0, column=0, padx=10, pady=10)
+    notebook.grid(row=1, column=0, padx=10, pady=(0, 10))
 
     # Define the frames (tabs) without pre-populating them
     tab1 = ttk.Frame(notebook, style="CustomFrame.TFrame")
@@ -150,12 +179,14 @@ def gui(tracker):
     tab3 = ttk.Frame(notebook, style="CustomFrame.TFrame")
     tab4 = ttk.Frame(notebook, style="CustomFrame.TFrame")
     tab5 = ttk.Frame(notebook, style="CustomFrame.TFrame")
+    tab6 = ttk.Frame(notebook, style="CustomFrame.TFrame")
 
     # Add the tabs to the notebook
     notebook.add(tab1, text='Balance')
     notebook.add(tab2, text='Graph')
     notebook.add(tab3, text='Expenses')
     notebook.add(tab4, text='Table')
+    notebook.add(tab6, text='Reports')
     notebook.add(tab5, text='Edit Data')
 
     '''
@@ -163,60 +194,30 @@ def gui(tracker):
         Some functions only get initialized when a tab is opened. 
         Thus, ignore error's, test via program to validate functionality.
     '''
-    def populate_table(tree, dataframe):
-        for _, row in dataframe.iterrows():
-            tree.insert("", "end", values=(row["date"], row["category_name"], f"{row['amount']:.2f}", row["comment"]))
-
-    def sort_by(tree, column, descending):
-        # Retrieve data to sort
-        data = [(tree.set(child, column), child) for child in tree.get_children("")]
-
-        # Convert data to the appropriate type for sorting
-        try:
-            data.sort(reverse=descending, key=lambda item: float(item[0]))  # Try to sort as float
-        except ValueError:
-            data.sort(reverse=descending, key=lambda item: item[0])  # Sort as string if conversion fails
-
-        # Rearrange items in sorted order
-        for index, (_, child) in enumerate(data):
-            tree.move(child, "", index)
-
-        # Reverse the sorting order for next click
-        tree.heading(column, command=lambda: sort_by(tree, column, not descending))
+    def populate_table(tree, rows, index="end"):
+        # Inserts the rows in their order, at the end or starting at the position index
+        for position, (trans_id, date, category_name, amount, comment) in enumerate(rows):
+            tree.insert("", index if index == "end" else index + position, iid=str(trans_id),
+                        values=(date, category_name, f"{amount:.2f}", comment))
 
     def delete_transaction(tree):
-        # Get the selected row
-        selected_item = tree.selection()
-        if not selected_item:
+        # Get the selected rows, their item ids are the transaction ids
+        selected_items = tree.selection()
+        if not selected_items:
             messagebox.showerror("Error", "Please select a transaction to delete.")
             return
-
-        # Get the 'id' of the selected transaction (assuming it's in the dataframe)
-        selected_transaction = tree.item(selected_item)["values"]
-        transaction_date = selected_transaction[0]  # Assuming first column is 'Date'
-        transaction_category = selected_transaction[1]  # Assuming second column is 'Category'
-        transaction_amount = selected_transaction[2]  # Assuming third column is 'Amount'
-        transaction_comment = selected_transaction[3]  # Assuming fourth column is 'Comment'
-
-        # Find the corresponding row in the dataframe using these values
-        transaction_row = table_data[
-            (table_data["date"] == transaction_date) &
-            (table_data["category_name"] == transaction_category) &
-            (table_data["amount"] == float(transaction_amount)) &
-            (table_data["comment"] == transaction_comment)
-            ]
-        if transaction_row.empty:
-            messagebox.showerror("Error", "Transaction not found in the database.")
+        archived = tracker.archived_ids(selected_items)
+        if archived:
+            messagebox.showerror("Error", f"{len(archived)} of the selected transactions are archived.\n"
+                                          "Restore their year (python cli.py restore YEAR) to delete them.")
             return
-        # Call the delete function from the tracker
-        transaction_id = transaction_row.iloc[0]["id"]
-        print(transaction_id)
 
-        # Delete transaction
-        tracker.del_transaction(transaction_id)
+        # Delete all selected transactions at once
+        tracker.del_transactions(selected_items)
 
-        # Remove the row from the treeview
-        tree.delete(selected_item)
+        # Remove the rows from the treeview, it shows the current data again
+        tree.delete(*selected_items)
+        rendered_versions[3] = tracker.data_version()
 
     def add_transaction():
         # Create a new window for adding transaction
@@ -227,7 +228,7 @@ def gui(tracker):
         # Variables for the entry fields
         transaction_type = tk.StringVar(value="Expense")  # Set default value to "Expense"
         category_var = tk.StringVar()
-        categories = list(tracker.read_categories()["name"])
+        categories = tracker.category_names()
         placeholder = "Select a category"
         amount_var = tk.DoubleVar()
         comment_var = tk.StringVar()
@@ -287,6 +288,7 @@ def gui(tracker):
         comment_entry.grid(row=5, column=1, columnspan=2, pady=5, sticky="n")
 
         # Calendar widget for selecting the date
+        from tkcalendar import Calendar
         date_label = ttk.Label(add_window, text="Date:", font=FONTS["subheading"])
         date_label.grid(row=6, column=0, pady=5, sticky="w")
         cal = Calendar(add_window, textvariable=date_var, date_pattern='yyyy-mm-dd')
@@ -363,7 +365,7 @@ def gui(tracker):
         add_window.config(padx=30, pady=20, bg=COLORS["background"])  # Padding for the window
 
         category_var = tk.StringVar()
-        categories = list(tracker.read_categories()["name"])
+        categories = tracker.category_names()
         placeholder = "Select a category"
         del_header = ttk.Label(add_window, text="Delete Category:", font=FONTS["heading"])
         del_header.grid(row=0, column=0, padx=25, pady=25, sticky="n")
@@ -387,22 +389,358 @@ def gui(tracker):
         delete_button = ttk.Button(add_window, text="Delete", command=delete_category, style="Custom.TButton")
         delete_button.grid(row=2, column=0, padx=25, pady=25)
 
+    def import_statement():
+        path = filedialog.askopenfilename(title="Import Statement",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            report = import_csv(tracker, path)
+        except (OSError, UnicodeDecodeError) as error:
+            messagebox.showerror("Error", f"Could not read the statement:\n{error}")
+            return
+
+        summary = (f"Imported {report['inserted']} of {report['rows']} rows "
+                   f"({report['rows_per_sec']:.0f} rows/sec).\n"
+                   f"Already imported: {report['duplicates']}\n"
+                   f"Errors: {len(report['errors'])}")
+        # Show the first few errors with their line numbers, the rest would not fit the dialog
+        for line, message in report["errors"][:5]:
+            summary += f"\n  Line {line}: {message}"
+        messagebox.showinfo("Import Statement", summary)
+
+    def show_loading(tab):
+        # Show a label on top of the tab's content while its data is loaded in the background
+        if tab not in loading_labels:
+            loading_labels[tab] = ttk.Label(tab, text="Loading...", font=FONTS["subheading"])
+        loading_labels[tab].place(relx=0.5, rely=0.5, anchor="center")
+        loading_labels[tab].lift()
+
+    def hide_loading(tab):
+        loading_labels[tab].place_forget()
+
+    def apply_filter(event=None):
+        # Build the filter from the filter bar, the database does the filtering
+        checked = [name for name, var in filter_categories.items() if var.get()]
+        try:
+            new_filter = Filter(
+                start=filter_vars["start"].get().strip() or None,
+                end=filter_vars["end"].get().strip() or None,
+                categories=None if len(checked) == len(filter_categories) else checked,
+                min_amount=filter_vars["min_amount"].get().strip() or None,
+                max_amount=filter_vars["max_amount"].get().strip() or None,
+                sign=FILTER_SIGNS[filter_vars["sign"].get()],
+                text=filter_vars["text"].get(),
+            )
+        except ValueError as error:
+            messagebox.showerror("Error", f"Invalid filter: {error}")
+            return
+        if new_filter == current_filter["filter"]:
+            return
+        current_filter["filter"] = new_filter
+        # The filtered tabs are out of date now, the visible one reloads right away
+        for tab_index in FILTERED_TABS:
+            rendered_versions.pop(tab_index, None)
+        on_tab_change(None)
+
+    def clear_filter():
+        for name, var in filter_vars.items():
+            var.set("All" if name == "sign" else "")
+        for var in filter_categories.values():
+            var.set(True)
+        apply_filter()
+
+    def refresh_category_menu():
+        # Categories may have been added or deleted since the menu was last shown
+        names = ["Income", *tracker.category_names()]
+        for name in list(filter_categories):
+            if name not in names:
+                del filter_categories[name]
+        category_menu.delete(0, "end")
+        for name in names:
+            var = filter_categories.setdefault(name, tk.BooleanVar(value=True))
+            category_menu.add_checkbutton(label=name, variable=var, command=apply_filter)
+
+    def load_graph(version):
+        # Imported here on the Tk thread, the worker only uses the loaded module
+        from helper_plot import BalanceGraph, prepare_graph_data
+        if "graph" not in views:
+            views["graph"] = BalanceGraph(tab2)
+        show_loading(tab2)
+
+        def render_graph(df):
+            # Update the existing graph
+            hide_loading(tab2)
+            rendered_versions[1] = version
+            views["graph"].update(df)
+
+        n_days, start, end = graph_range["n_days"], graph_range["start"], graph_range["end"]
+        filter_by = current_filter["filter"]
+        worker.submit("tab", lambda reader: prepare_graph_data(reader.calculate_daily_balance(n_days, start, end,
+                                                                                               filter_by)),
+                      render_graph)
+
+    def select_graph_range(event):
+        choice = range_var.get()
+        if choice in GRAPH_RANGES:
+            graph_range.update(n_days=GRAPH_RANGES[choice], start=None, end=None)
+            load_graph(tracker.data_version())
+        else:
+            custom_graph_range()
+
+    def custom_graph_range():
+        # Create a new window for choosing the first and last day of the graph
+        range_window = tk.Toplevel(root)
+        range_window.title("Custom Range")
+        range_window.config(padx=30, pady=20, bg=COLORS["background"])  # Padding for the window
+
+        today = datetime.date.today()
+        start_var = tk.StringVar(value=(today - datetime.timedelta(days=90)).strftime('%Y-%m-%d'))
+        end_var = tk.StringVar(value=today.strftime('%Y-%m-%d'))
+
+        from tkcalendar import Calendar
+        start_label = ttk.Label(range_window, text="From:", font=FONTS["subheading"])
+        start_label.grid(row=0, column=0, pady=5, sticky="w")
+        start_cal = Calendar(range_window, textvariable=start_var, date_pattern='yyyy-mm-dd')
+        start_cal.grid(row=1, column=0, padx=10, pady=5)
+
+        end_label = ttk.Label(range_window, text="To:", font=FONTS["subheading"])
+        end_label.grid(row=0, column=1, pady=5, sticky="w")
+        end_cal = Calendar(range_window, textvariable=end_var, date_pattern='yyyy-mm-dd')
+        end_cal.grid(row=1, column=1, padx=10, pady=5)
+
+        def apply_range():
+            start, end = start_var.get(), end_var.get()
+            # ISO dates compare like the days they stand for
+            if start > end:
+                messagebox.showerror("Error", "The first day must not be after the last day.")
+                return
+            graph_range.update(n_days=None, start=start, end=end)
+            range_window.destroy()
+            load_graph(tracker.data_version())
+
+        apply_button = ttk.Button(range_window, text="Show", command=apply_range, style="Custom.TButton")
+        apply_button.grid(row=2, column=0, columnspan=2, pady=20)
+
+    def load_report(version):
+        if "report" not in views:
+            # Periods on top, the categories of the selected period below
+            period_columns = ("Period", "Income", "Expenses", "Net", "Balance")
+            category_columns = ("Category", "Income", "Expenses", "Net", "Share")
+            period_table = ttk.Treeview(tab6, columns=period_columns, show="headings", height=8,
+                                        selectmode="browse")
+            category_table = ttk.Treeview(tab6, columns=category_columns, show="headings", height=8)
+            for table, columns in ((period_table, period_columns), (category_table, category_columns)):
+                for col in columns:
+                    table.heading(col, text=col)
+                    table.column(col, anchor="e", width=100)
+                table.column(columns[0], anchor="w", width=120)
+            period_table.pack(fill="both", expand=True, padx=20, pady=5)
+            category_table.pack(fill="both", expand=True, padx=20, pady=5)
+            period_table.bind("<<TreeviewSelect>>", lambda event: load_period_categories())
+            views["report"] = period_table
+            views["report_categories"] = category_table
+        show_loading(tab6)
+        period = REPORT_PERIODS[report_period_var.get()]
+
+        def render_report(df):
+            hide_loading(tab6)
+            rendered_versions[4] = version
+            period_table = views["report"]
+            period_table.delete(*period_table.get_children())
+            views["report_categories"].delete(*views["report_categories"].get_children())
+            # Newest period first
+            for row in reversed(list(df.itertuples(index=False))):
+                period_table.insert("", "end", iid=row.period, values=(
+                    row.period, f"{row.income:.2f}", f"{row.expenses:.2f}", f"{row.net:.2f}", f"{row.balance:.2f}"))
+            if df.shape[0]:
+                period_table.selection_set(df["period"].iloc[-1])
+            # The read-only connections can't store rollups: aggregate the closed months on the worker and
+            # only store them here, unless something was written in the meantime
+            worker.submit("rollups", lambda reader: reader.pending_rollups(), store_rollups)
+
+        def store_rollups(pending):
+            if tracker.data_version() == version:
+                tracker.store_rollups(*pending)
+
+        worker.submit("tab", lambda reader: reader.report(period), render_report)
+
+    def load_period_categories():
+        selected = views["report"].selection()
+        if not selected:
+            return
+        period = REPORT_PERIODS[report_period_var.get()]
+
+        def render_categories(df):
+            category_table = views["report_categories"]
+            category_table.delete(*category_table.get_children())
+            for row in df.itertuples(index=False):
+                share = "" if row.share != row.share else f"{row.share:.1f} %"  # NaN without expenses
+                category_table.insert("", "end", values=(
+                    row.category_name, f"{row.income:.2f}", f"{row.expenses:.2f}", f"{row.net:.2f}", share))
+
+        worker.submit("report_categories",
+                      lambda reader: reader.category_report(period, selected[0], selected[0]), render_categories)
+
+    def show_diagnostics(event=None):
+        # Hidden developer view: recorded latencies of the Tracker methods and SQL statements
+        if "diagnostics" in dialogs and dialogs["diagnostics"].winfo_exists():
+            dialogs["diagnostics"].lift()
+            return
+        window = dialogs["diagnostics"] = tk.Toplevel(root)
+        window.title("Diagnostics")
+        window.config(padx=20, pady=20, bg=COLORS["background"])
+
+        enabled_var = tk.BooleanVar(value=tracker.stats is not None)
+        slow_var = tk.StringVar(value="" if diagnostics["slow_ms"] is None else str(diagnostics["slow_ms"]))
+
+        def toggle():
+            if enabled_var.get():
+                diagnostics["stats"] = tracker.enable_stats(diagnostics["stats"], diagnostics["slow_ms"])
+                worker.stats = diagnostics["stats"]
+            else:
+                tracker.disable_stats()
+                worker.stats = None
+            refresh()
+
+        def apply_slow_threshold(event=None):
+            try:
+                diagnostics["slow_ms"] = float(slow_var.get()) if slow_var.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Error", "Please enter the threshold in milliseconds.", parent=window)
+                return
+            if diagnostics["stats"] is not None:
+                diagnostics["stats"].slow_ms = diagnostics["slow_ms"]
+
+        controls = ttk.Frame(window, style="CustomFrame.TFrame")
+        controls.grid(row=0, column=0, sticky="w")
+        ttk.Checkbutton(controls, text="Record statistics", variable=enabled_var, command=toggle).pack(side="left")
+        ttk.Label(controls, text="Log queries slower than (ms):").pack(side="left", padx=(20, 0))
+        slow_entry = ttk.Entry(controls, textvariable=slow_var, width=8)
+        slow_entry.pack(side="left")
+        slow_entry.bind("<Return>", apply_slow_threshold)
+        slow_entry.bind("<FocusOut>", apply_slow_threshold)
+
+        views_notebook = ttk.Notebook(window)
+        views_notebook.grid(row=1, column=0, pady=10, sticky="nsew")
+        method_columns = ("Method", "Calls", "Total ms", "Mean ms", "Max ms")
+        statement_columns = ("Statement", "Calls", "Rows", "Total ms", "Max ms", "VM steps")
+        method_table = ttk.Treeview(views_notebook, columns=method_columns, show="headings", height=12)
+        statement_table = ttk.Treeview(views_notebook, columns=statement_columns, show="headings", height=12)
+        for table, columns in ((method_table, method_columns), (statement_table, statement_columns)):
+            for col in columns:
+                table.heading(col, text=col)
+                table.column(col, anchor="e", width=80)
+            table.column(columns[0], anchor="w", width=420 if table is statement_table else 200)
+        slow_text = tk.Text(views_notebook, width=100, height=14, wrap="none")
+        views_notebook.add(method_table, text="Methods")
+        views_notebook.add(statement_table, text="Statements")
+        views_notebook.add(slow_text, text="Slow queries")
+        summary = ttk.Label(window, font=FONTS["small"])
+        summary.grid(row=2, column=0, sticky="w")
+
+        def refresh():
+            method_table.delete(*method_table.get_children())
+            statement_table.delete(*statement_table.get_children())
+            slow_text.delete("1.0", "end")
+            snapshot = tracker.stats_snapshot() or (diagnostics["stats"] and diagnostics["stats"].snapshot())
+            if not snapshot:
+                summary.config(text="Statistics are not recorded.")
+                return
+            for name, calls, total, longest in snapshot["methods"]:
+                method_table.insert("", "end", values=(name, calls, f"{total:.2f}", f"{total / calls:.2f}",
+                                                       f"{longest:.2f}"))
+            for sql, calls, total, longest, rows, steps in snapshot["statements"]:
+                statement_table.insert("", "end", values=(" ".join(sql.split()), calls, rows, f"{total:.2f}",
+                                                          f"{longest:.2f}", steps))
+            for when, sql, params, milliseconds, plan in reversed(snapshot["slow"]):
+                slow_text.insert("end", f"{datetime.datetime.fromtimestamp(when):%H:%M:%S}  {milliseconds:.1f} ms  "
+                                        f"{' '.join(sql.split())}  {params!r}\n")
+                slow_text.insert("end", "".join(f"    {line}\n" for line in plan))
+            summary.config(text=f"{len(snapshot['methods'])} methods, {len(snapshot['statements'])} statements, "
+                                f"{len(snapshot['slow'])} slow queries")
+
+        def reset():
+            if diagnostics["stats"] is not None:
+                diagnostics["stats"].reset()
+            refresh()
+
+        buttons = ttk.Frame(window, style="CustomFrame.TFrame")
+        buttons.grid(row=3, column=0, pady=10)
+        ttk.Button(buttons, text="Refresh", command=refresh, style="Custom.TButton").pack(side="left", padx=10)
+        ttk.Button(buttons, text="Reset", command=reset, style="Custom.TButton").pack(side="left", padx=10)
+        refresh()
+
     def on_close():
-        tracker.close_db()  # Close the database connection
+        worker.shutdown()  # Stop the background reads
+        manager.close()  # Close the database connections
         root.quit()
 
     '''
         Adding static widgets
     '''
-    graph(tab2, tracker.calculate_daily_balance())
+    # Widgets of the Balance, Graph and Expenses tabs: created on the first visit, then updated in place
+    views = {}
+    loading_labels = {}
+    # Open dialog windows that exist only once
+    dialogs = {}
+    # Instrumentation of the Tracker and the worker's readers, kept between openings of the diagnostics view
+    diagnostics = {"stats": None, "slow_ms": 100.0}
+    # Tab index -> Tracker.data_version() of the data the tab shows
+    rendered_versions = {}
+    # Filter of the Graph, Expenses and Table tabs, None until the filter bar is applied
+    current_filter = {"filter": None}
+
+    # Filter bar above the tabs: dates, categories, amount range, type and words in the comment.
+    # Enter in a field or a change of the selectors applies it.
+    filter_bar = ttk.Frame(root, style="CustomFrame.TFrame")
+    filter_bar.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="w")
+    filter_vars = {name: tk.StringVar() for name in ("start", "end", "min_amount", "max_amount", "text")}
+    filter_vars["sign"] = tk.StringVar(value="All")
+    # Category name -> BooleanVar of its entry in the categories menu
+    filter_categories = {}
+    for label, name, width in (("From", "start", 11), ("To", "end", 11), ("Amount", "min_amount", 8),
+                               ("-", "max_amount", 8), ("Comment", "text", 16)):
+        ttk.Label(filter_bar, text=label).pack(side="left")
+        entry = ttk.Entry(filter_bar, textvariable=filter_vars[name], width=width)
+        entry.bind("<Return>", apply_filter)
+        entry.pack(side="left")
+        if name == "end":
+            category_button = ttk.Menubutton(filter_bar, text="Categories")
+            category_menu = tk.Menu(category_button, tearoff=False, postcommand=refresh_category_menu)
+            category_button["menu"] = category_menu
+            category_button.pack(side="left", padx=5)
+    sign_combobox = ttk.Combobox(filter_bar, textvariable=filter_vars["sign"], values=list(FILTER_SIGNS),
+                                 state="readonly", width=9)
+    sign_combobox.bind("<<ComboboxSelected>>", apply_filter)
+    sign_combobox.pack(side="left", padx=5)
+    ttk.Button(filter_bar, text="Apply", command=apply_filter).pack(side="left", padx=5)
+    ttk.Button(filter_bar, text="Clear", command=clear_filter).pack(side="left")
+    # Range of the Graph tab, chosen with the selector above the graph
+    graph_range = {"n_days": 30, "start": None, "end": None}
+    range_var = tk.StringVar(value="30 days")
+    range_combobox = ttk.Combobox(tab2, textvariable=range_var, values=[*GRAPH_RANGES, "Custom..."],
+                                  state="readonly", style="Custom.TCombobox")
+    range_combobox.bind("<<ComboboxSelected>>", select_graph_range)
+    range_combobox.pack(pady=5)
+    # Period of the Reports tab
+    report_period_var = tk.StringVar(value="Monthly")
+    report_period_combobox = ttk.Combobox(tab6, textvariable=report_period_var, values=list(REPORT_PERIODS),
+                                          state="readonly", style="Custom.TCombobox")
+    report_period_combobox.bind("<<ComboboxSelected>>", lambda event: load_report(tracker.data_version()))
+    report_period_combobox.pack(pady=5)
     label5 = ttk.Label(tab5, text="Edit Data", font=FONTS["heading"])
     label5.pack(pady=10)
+    # Double-clicking the heading opens the diagnostics view
+    label5.bind("<Double-Button-1>", show_diagnostics)
     add_button = ttk.Button(tab5, text="Add Transaction", command=add_transaction, style="Custom.TButton")
     add_button.pack(pady=20)
     add2_button = ttk.Button(tab5, text="Add Category", command=add_category, style="Custom.TButton")
     add2_button.pack(pady=20)
     del_category_button = ttk.Button(tab5, text="Delete Category", command=del_category, style="Custom.TButton")
     del_category_button.pack(pady=20)
+    import_button = ttk.Button(tab5, text="Import Statement", command=import_statement, style="Custom.TButton")
+    import_button.pack(pady=20)
 
     '''
         Adding Dynamically changing widgets.
@@ -412,41 +750,57 @@ def gui(tracker):
     def on_tab_change(event):
         selected_tab = notebook.index(notebook.select())
 
+        # A request for the previous tab is stale now
+        worker.cancel("tab")
+        worker.cancel("report_categories")
+
+        # Nothing to do if the tab already shows the current data
+        version = tracker.data_version()
+        if rendered_versions.get(selected_tab) == version:
+            return
+
         # Finance Overview tab index
         if selected_tab == 0:
-            # Clear previous graph
-            for widget in tab1.winfo_children():
-                widget.destroy()
+            show_loading(tab1)
+
+            def render_balance(current_balance):
+                hide_loading(tab1)
+                rendered_versions[0] = version
+                if "balance" not in views:
+                    # Create and pack a title label for the Balance section
+                    tab1_title = ttk.Label(tab1, text="Balance:", font=FONTS["heading"])
+                    tab1_title.pack(pady=50)
 
-            # Create and pack a title label for the Balance section
-            tab1_title = ttk.Label(tab1, text="Balance:", font=FONTS["heading"])
-            tab1_title.pack(pady=50)
+                    # Create and pack a label that displays the current balance
+                    views["balance"] = ttk.Label(tab1, font=FONTS["subheading"])
+                    views["balance"].pack(pady=10)
 
-            # Create and pack a label that displays the current balance, retrieved from the tracker object
-            balance = ttk.Label(tab1, text=f"{tracker.balance()} €", font=FONTS["subheading"])
-            balance.pack(pady=10)
+                    # Create and pack a footer label with version information at the bottom of the tab
+                    footer = ttk.Label(tab1, text="Finance Tracker - Version 1.0", font=FONTS["small"])
+                    footer.pack(side="bottom", pady=10)
+                views["balance"].config(text=f"{current_balance} €")
 
-            # Create and pack a footer label with version information at the bottom of the tab
-            footer = ttk.Label(tab1, text="Finance Tracker - Version 1.0", font=FONTS["small"])
-            footer.pack(side="bottom", pady=10)
+            worker.submit("tab", lambda reader: reader.balance(), render_balance)
 
         # Finance Overview tab index
         if selected_tab == 1:
-            # Clear previous graph
-            for widget in tab2.winfo_children():
-                widget.destroy()
-
-            # Draw updated graph
-            graph(tab2, tracker.calculate_daily_balance())
+            load_graph(version)
 
         # Expenses tab index
         elif selected_tab == 2:
-            # Clear previous graph
-            for widget in tab3.winfo_children():
-                widget.destroy()
+            from helper_plot import ExpensesPlot
+            show_loading(tab3)
+
+            def render_bar_plot(df):
+                # Update the bar plot, it is created on the first visit of the tab
+                hide_loading(tab3)
+                rendered_versions[2] = version
+                if "expenses" not in views:
+                    views["expenses"] = ExpensesPlot(tab3)
+                views["expenses"].update(df)
 
-            # Draw updated bar plot
-            bar_plot(tab3, tracker.read_expenses())
+            filter_by = current_filter["filter"]
+            worker.submit("tab", lambda reader: reader.expenses_by_category(filter_by=filter_by), render_bar_plot)
 
         # Table tab index
         elif selected_tab == 3:
@@ -454,37 +808,169 @@ def gui(tracker):
             for widget in tab4.winfo_children():
                 widget.destroy()
 
-            # Read the transactions data
-            table_data = tracker.read_transactions()
-
             # Create the Treeview widget for displaying the transactions
             columns = ("Date", "Category", "Amount", "Comment")
-            table = ttk.Treeview(tab4, columns=columns, show="headings", height=10)
-
-            # Define column headings and setup sort functionality
+            table = ttk.Treeview(tab4, columns=columns, show="headings", height=10, selectmode="extended")
+
+            # The table is filled page by page: the next page is fetched when the user scrolls near the end.
+            # It keeps at most TABLE_PAGES pages, the page at the other end is dropped and fetched again when the
+            # user scrolls back. Every page remembers its first and last row, the keys of the pages before and after
+            # it, or for search results its offset.
+            # Sorting re-queries the database, newest first by default.
+            # With text in the search box the table shows the ranked search results instead.
+            paging = {"pages": [], "done": False, "pending": False, "order_by": "date", "descending": True,
+                      "search": "", "after_id": None}
+
+            def reload():
+                paging.update(pages=[], done=False)
+                table.delete(*table.get_children())
+                load_page()
+                table.yview_moveto(0)
+
+            def sort_by(order_by):
+                # Clicking the sorted column again reverses the order
+                if paging["order_by"] == order_by:
+                    paging["descending"] = not paging["descending"]
+                else:
+                    paging["order_by"] = order_by
+                    paging["descending"] = order_by == "date"
+                # Sorting shows all transactions again, search results are ordered by relevance
+                search_var.set("")
+                paging["search"] = ""
+                reload()
+
+            def on_search_change(*args):
+                # Search once the user pauses typing, not on every keystroke
+                if paging["after_id"] is not None:
+                    table.after_cancel(paging["after_id"])
+                paging["after_id"] = table.after(SEARCH_DELAY_MS, start_search)
+
+            def start_search():
+                paging["after_id"] = None
+                # The tab may have been rebuilt in the meantime
+                if table.winfo_exists() and search_var.get().strip() != paging["search"]:
+                    paging["search"] = search_var.get().strip()
+                    reload()
+
+            search_frame = ttk.Frame(tab4, style="CustomFrame.TFrame")
+            ttk.Label(search_frame, text="Search:").pack(side="left", padx=5)
+            search_var = tk.StringVar()
+            search_entry = ttk.Entry(search_frame, textvariable=search_var, width=40)
+            search_entry.pack(side="left")
+            search_var.trace_add("write", on_search_change)
+
+            # Define column headings and setup sort functionality (Comment has no index, it is not sortable)
             for col in columns:
-                table.heading(col, text=col, command=lambda _col=col: sort_by(table, _col, False))
+                if col in TABLE_SORT_ORDERS:
+                    table.heading(col, text=col, command=lambda _col=col: sort_by(TABLE_SORT_ORDERS[_col]))
+                else:
+                    table.heading(col, text=col)
                 table.column(col, anchor="center", width=100)  # Adjust width as needed
 
             # Add a vertical scrollbar
             scrollbar = ttk.Scrollbar(tab4, orient="vertical", command=table.yview)
-            table.configure(yscrollcommand=scrollbar.set)
 
-            # Pack the table and scrollbar
-            table.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
-            scrollbar.grid(row=0, column=1, sticky="ns")
+            def fetch(page=None, backward=False):
+                # Rows of the page after the given page (the first page without one) or before it, and their offset
+                if paging["search"]:
+                    if page is None:
+                        offset = 0
+                    else:
+                        offset = page["offset"] - TABLE_PAGE_SIZE if backward else page["offset"] + page["size"]
+                    return tracker.search(paging["search"], limit=TABLE_PAGE_SIZE, offset=offset,
+                                          filter_by=current_filter["filter"]), offset
+                # The page before is the page after the first row in the reversed order
+                rows = tracker.fetch_transactions_page(
+                    after=page and (page["first"] if backward else page["last"]), limit=TABLE_PAGE_SIZE,
+                    order_by=paging["order_by"], descending=paging["descending"] != backward,
+                    filter_by=current_filter["filter"])
+                return (rows[::-1] if backward else rows), None
+
+            def new_page(rows, offset, top):
+                return {"items": [str(row[0]) for row in rows], "first": rows[0], "last": rows[-1],
+                        "size": len(rows), "offset": offset, "top": top}
+
+            def drop_page(page):
+                # Rows may have been deleted in the meantime
+                table.delete(*(item for item in page["items"] if table.exists(item)))
+
+            def keeping_view(change):
+                # Runs change() without moving the rows in view, it adds or removes rows above them
+                children = table.get_children()
+                anchor = None
+                if children:
+                    anchor = children[min(int(float(table.yview()[0]) * len(children)), len(children) - 1)]
+                change()
+                if anchor is not None and table.exists(anchor):
+                    table.yview_moveto(table.index(anchor) / len(table.get_children()))
+
+            def load_page():
+                paging["pending"] = False
+                pages = paging["pages"]
+                if paging["done"]:
+                    return
+                rows, offset = fetch(pages[-1] if pages else None)
+                if rows:
+                    populate_table(table, rows)
+                    pages.append(new_page(rows, offset, top=not pages))
+                paging["done"] = len(rows) < TABLE_PAGE_SIZE
+                if len(pages) > TABLE_PAGES:
+                    keeping_view(lambda: drop_page(pages.pop(0)))
+
+            def load_previous_page():
+                paging["pending"] = False
+                pages = paging["pages"]
+                if not pages or pages[0]["top"]:
+                    return
+                rows, offset = fetch(pages[0], backward=True)
+                if not rows:
+                    pages[0]["top"] = True
+                    return
+
+                def insert():
+                    populate_table(table, rows, index=0)
+                    pages.insert(0, new_page(rows, offset, top=len(rows) < TABLE_PAGE_SIZE or offset == 0))
+
+                keeping_view(insert)
+                if len(pages) > TABLE_PAGES:
+                    drop_page(pages.pop())
+                    paging["done"] = False
+
+            def on_table_scroll(first, last):
+                scrollbar.set(first, last)
+                # Load outside of the scroll callback, inserting rows triggers it again
+                if paging["pending"]:
+                    return
+                if float(last) > 0.9 and not paging["done"]:
+                    paging["pending"] = True
+                    table.after_idle(load_page)
+                elif float(first) < 0.1 and paging["pages"] and not paging["pages"][0]["top"]:
+                    paging["pending"] = True
+                    table.after_idle(load_previous_page)
+
+            table.configure(yscrollcommand=on_table_scroll)
+
+            # Pack the search box, the table and the scrollbar
+            search_frame.grid(row=0, column=0, sticky="w", padx=20, pady=(20, 0))
+            table.grid(row=1, column=0, sticky="nsew", padx=20, pady=20)
+            scrollbar.grid(row=1, column=1, sticky="ns")
 
             # Configure grid weights for proper resizing
             tab4.grid_columnconfigure(0, weight=1)
-            tab4.grid_rowconfigure(0, weight=1)
+            tab4.grid_rowconfigure(1, weight=1)
 
-            # Add the 'Delete Selected Transaction' button
-            delete_button = ttk.Button(tab4, text="Delete Selected Transaction",
+            # Add the 'Delete Selected Transactions' button
+            delete_button = ttk.Button(tab4, text="Delete Selected Transactions",
                                        command=lambda: delete_transaction(table), style="Custom.TButton")
-            delete_button.grid(row=1, column=0, pady=10, padx=10)
+            delete_button.grid(row=2, column=0, pady=10, padx=10)
+
+            # Populate the table with the first page
+            load_page()
+            rendered_versions[3] = version
 
-            # Populate the table with data
-            populate_table(table, table_data)
+        # Reports tab index
+        elif selected_tab == 4:
+            load_report(version)
     notebook.bind("<<NotebookTabChanged>>", on_tab_change)
 
     # Properly closing the program